@@ -0,0 +1,4 @@
+from src.app.dags.liftoff import create_liftoff_elt_dag
+
+
+liftoff_elt = create_liftoff_elt_dag()
@@ -0,0 +1,160 @@
+from typing import Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+import argparse
+
+from requests import HTTPError
+
+from src import config
+from src.app import custom_orchestrator as orchestrator
+from src.app.caches import liftoff as ca_lift
+from src.app.extractors import secret as ex_secret
+from src.app.planners import liftoff as pn_lift
+from src.db.sqlite import backfill_checkpoint
+
+
+class ReportBackfill:
+    """
+    Backfills reports of many accounts over a long period as independent
+    units of (account x date window). Every unit goes through
+    pending -> posted -> ready -> downloaded -> loaded and the step it
+    reached is checkpointed, so a rerun with the same backfill_id only
+    continues the unfinished units from their last step. Windows are loaded
+    with REPLACE PARTITION, so reloading a half-loaded unit is safe.
+    """
+
+    def __init__(
+            self,
+            backfill_id: str,
+            start_time: str,
+            end_time: str,
+            api_keys: Optional[Sequence[str]] = None,
+            window_days: Optional[int] = config.Backfill.WINDOW_DAYS,
+            max_parallel_units: Optional[int] = config.Backfill.MAX_PARALLEL_UNITS,
+            max_attempts: Optional[int] = config.Backfill.MAX_ATTEMPTS,
+            checkpoint: Optional[backfill_checkpoint.LiftoffBackfillCheckpoint] = None,
+            cache: Optional[ca_lift.ResponseCache] = None,
+            secret_provider: Optional[ex_secret.LiftoffSecretProvider] = None
+    ) -> None:
+        self.backfill_id = backfill_id
+        self.start_time = start_time
+        self.end_time = end_time
+        self.api_keys = api_keys
+        self.window_days = window_days
+        self.max_parallel_units = max_parallel_units
+        self.max_attempts = max_attempts
+        self.checkpoint = backfill_checkpoint.LiftoffBackfillCheckpoint() if checkpoint is None else checkpoint
+        self.cache = ca_lift.ResponseCache(config.Backfill.CACHE_DIRECTORY) if cache is None else cache
+        self.secret_provider = ex_secret.get_default_secret_provider() if secret_provider is None else secret_provider
+
+    def plan(self) -> None:
+        api_keys = self.api_keys
+        if api_keys is None:
+            api_keys = [account["api_key"] for account in self.secret_provider.get_accounts()]
+        windows = pn_lift.ReportWindowPlanner(self.window_days).split(self.start_time, self.end_time)
+        self.checkpoint.add_units(
+            self.backfill_id,
+            [(api_key, start, end) for api_key in api_keys for start, end in windows]
+        )
+
+    def run(self) -> dict[str, int]:
+        self.plan()
+        units = [unit for unit in self.checkpoint.get_unfinished(self.backfill_id) if unit["attempts"] < self.max_attempts]
+        print(f"Backfill {self.backfill_id}: {len(units)} units to run")
+        with ThreadPoolExecutor(max_workers=self.max_parallel_units) as executor:
+            futures = {executor.submit(self.run_unit, unit): unit for unit in units}
+            for future in as_completed(futures):
+                unit = futures[future]
+                try:
+                    future.result()
+                except Exception as error:
+                    print(f"The unit {unit['api_key']} {unit['start_time']} - {unit['end_time']} failed: {error}")
+        summary = self.checkpoint.get_summary(self.backfill_id)
+        print(f"Backfill {self.backfill_id}: {summary}")
+        return summary
+
+    def run_unit(self, unit: dict) -> None:
+        api_key, start_time, end_time = unit["api_key"], unit["start_time"], unit["end_time"]
+        state, report_id = unit["state"], unit["report_id"]
+        elt = orchestrator.ELTReport(
+            api_key,
+            secret_provider=self.secret_provider,
+            load_mode="replace",
+            cache=self.cache
+        )
+
+        def save(state: str, rows: Optional[int] = None, error: Optional[str] = None, attempt: bool = False) -> None:
+            if attempt and unit["attempts"] + 1 >= self.max_attempts:
+                state = "failed"
+            self.checkpoint.update(self.backfill_id, api_key, start_time, end_time, state, report_id, rows, error, attempt)
+
+        try:
+            if state in ("pending", "failed"):
+                report_id = elt.post_report(start_time, end_time)
+                state = "posted"
+                save(state)
+            if state == "posted":
+                if not elt.check_report_status(report_id):
+                    # the report failed or expired, post it again on the next run
+                    report_id = None
+                    save("pending", error="report failed", attempt=True)
+                    return
+                state = "ready"
+                save(state)
+            if state == "ready":
+                elt.download_report(report_id)
+                state = "downloaded"
+                save(state)
+            if state == "downloaded":
+                rows = elt.load_report_streaming(report_id, start_time, end_time)
+                save("loaded", rows=rows)
+        except Exception as error:
+            if state in ("ready", "downloaded") and self.is_report_expired(error):
+                # a resumed unit outlived its report, post it again on the next run
+                elt.registry.update_state(report_id, "expired")
+                report_id = None
+                save("pending", error="report expired", attempt=True)
+                return
+            save(state, error=f"{type(error).__name__}: {error}", attempt=True)
+            raise
+
+    def is_report_expired(
+            self,
+            error: Exception,
+            statuses: Optional[tuple[int]] = config.Backfill.EXPIRED_REPORT_STATUSES
+    ) -> bool:
+        return (
+            isinstance(error, HTTPError)
+            and error.response is not None
+            and error.response.status_code in statuses
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Resumable Liftoff report backfill")
+    parser.add_argument("--backfill-id", help="checkpoint id, rerun with the same id to resume")
+    parser.add_argument("--start-time", default=config.LiftoffApi.PostReports.DEFAULT_START_TIME)
+    parser.add_argument("--end-time", default=date.today().strftime(config.LiftoffApi.PostReports.DATE_REQUEST_FORMAT))
+    parser.add_argument("--api-key", action="append", dest="api_keys", help="repeat for several accounts, all by default")
+    parser.add_argument("--window-days", type=int, default=config.Backfill.WINDOW_DAYS)
+    parser.add_argument("--max-parallel-units", type=int, default=config.Backfill.MAX_PARALLEL_UNITS)
+    parser.add_argument("--max-attempts", type=int, default=config.Backfill.MAX_ATTEMPTS)
+    parser.add_argument("--status", action="store_true", help="print the checkpointed states and exit")
+    args = parser.parse_args()
+    backfill_id = args.backfill_id or f"report_{args.start_time}_{args.end_time}"
+    if args.status:
+        print(backfill_checkpoint.LiftoffBackfillCheckpoint().get_summary(backfill_id))
+        return
+    ReportBackfill(
+        backfill_id,
+        args.start_time,
+        args.end_time,
+        api_keys=args.api_keys,
+        window_days=args.window_days,
+        max_parallel_units=args.max_parallel_units,
+        max_attempts=args.max_attempts
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+from typing import Optional, Iterable, Iterator, Any
+from threading import Lock
+from time import time
+import hashlib
+import json
+import os
+
+import zstandard
+
+from src import config
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of raw API responses. Payloads are stored
+    zstd-compressed under the hash of (account, method, url, params), entries
+    older than max_age_seconds are ignored and the oldest entries are evicted
+    once the cache grows over max_bytes. The size is tracked as entries are
+    written, so the directory is only scanned when it goes over max_bytes or
+    once per max_age_seconds to drop expired entries; the scan also picks up
+    what other processes wrote.
+    """
+
+    suffix = ".zst"
+
+    def __init__(
+            self,
+            directory: Optional[str] = config.ResponseCache.DIRECTORY,
+            max_bytes: Optional[int] = config.ResponseCache.MAX_BYTES,
+            max_age_seconds: Optional[int] = config.ResponseCache.MAX_AGE_SECONDS,
+            compression_level: Optional[int] = config.ResponseCache.COMPRESSION_LEVEL
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.compression_level = compression_level
+        self.lock = Lock()
+        self.size: Optional[int] = None # bytes on disk as of the last scan plus the writes since
+        self.scanned = 0.0
+
+    def create_key(
+            self,
+            api_key: str,
+            method: str,
+            url: str,
+            params: Optional[Any] = None
+    ) -> str:
+        raw_key = json.dumps(
+            [api_key, method.upper(), url, params],
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+    def create_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def is_fresh(self, path: str) -> bool:
+        try:
+            return time() - os.path.getmtime(path) <= self.max_age_seconds
+        except FileNotFoundError:
+            return False
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self.create_path(key)
+        if not self.is_fresh(path):
+            return None
+        with open(path, "rb") as file:
+            return zstandard.ZstdDecompressor().stream_reader(file).read()
+
+    def iter_chunks(
+            self,
+            key: str,
+            chunk_size: Optional[int] = config.LiftoffApi.GetReportsIdData.STREAM_CHUNK_SIZE
+    ) -> Optional[Iterator[bytes]]:
+        path = self.create_path(key)
+        if not self.is_fresh(path):
+            return None
+        return self.read_chunks(path, chunk_size)
+
+    def read_chunks(self, path: str, chunk_size: int) -> Iterator[bytes]:
+        with open(path, "rb") as file, zstandard.ZstdDecompressor().stream_reader(file) as reader:
+            while chunk := reader.read(chunk_size):
+                yield chunk
+
+    def put(self, key: str, content: bytes) -> None:
+        self.put_chunks(key, [content])
+
+    def put_chunks(self, key: str, chunks: Iterable[bytes]) -> None:
+        for _ in self.tee_chunks(key, chunks):
+            pass
+
+    def tee_chunks(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Passes chunks through while writing them to the cache. The entry only
+        appears once the stream is fully read, so a broken download is never cached.
+        """
+        path = self.create_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{id(chunks)}.tmp"
+        compressor = zstandard.ZstdCompressor(level=self.compression_level)
+        try:
+            with open(temp_path, "wb") as file, compressor.stream_writer(file) as writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+                    yield chunk
+            added = os.path.getsize(temp_path) - self.get_size(path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.add_size(added)
+
+    def get_size(self, path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def add_size(self, added: int) -> None:
+        with self.lock:
+            if self.size is not None:
+                self.size += added
+            if self.size is None or self.size > self.max_bytes or time() - self.scanned > self.max_age_seconds:
+                self.evict_entries()
+
+    def iter_entries(self) -> Iterator[os.DirEntry]:
+        if not os.path.isdir(self.directory):
+            return
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith(self.suffix):
+                        yield entry
+
+    def evict(self) -> None:
+        with self.lock:
+            self.evict_entries()
+
+    def evict_entries(self) -> None:
+        now = time()
+        entries = []
+        total_bytes = 0
+        for entry in self.iter_entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.max_age_seconds:
+                self.remove(entry.path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_bytes += stat.st_size
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            self.remove(path)
+            total_bytes -= size
+        self.size = total_bytes
+        self.scanned = now
+
+    def remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = Lock()
+
+
+def get_default_cache() -> ResponseCache:
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ResponseCache()
+    return _default_cache
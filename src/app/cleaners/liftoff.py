@@ -1,9 +1,13 @@
 from abc import ABC, abstractmethod
-from typing import Union, List, Dict, Optional, Any
+from typing import Union, List, Dict, Optional, Any, IO
 import json
 from datetime import datetime
 
 import pandas
+from pandas.io.parsers import TextFileReader
+
+from src.app.cleaners.sanitizer import SingleQuoteSanitizer
+from src.app.metrics.liftoff import get_metrics
 
 
 class APIResponseCleanerFactory(ABC):
@@ -36,11 +40,12 @@ class APIResponseCleanerFactory(ABC):
             df: Optional[pandas.DataFrame] = None,
             columns: Optional[list[str]] = None
     ) -> pandas.DataFrame:
-        df = self.transform_response_to_df(self.response)
-        columns = self.single_quote_columns if columns is None else columns
-        for column in columns:
-            df[column] = df[column].str.replace("'", " ")
-        return df
+        df = self.transform_response_to_df(self.response) if df is None else df
+        with get_metrics().timer("clean.seconds", account=self.api_key, cleaner=type(self).__name__):
+            return self.get_sanitizer(columns).sanitize_df(df)
+
+    def get_sanitizer(self, columns: Optional[list[str]] = None) -> SingleQuoteSanitizer:
+        return SingleQuoteSanitizer(self.single_quote_columns if columns is None else columns)
     
     def transform_response_to_df(self, data: list[dict[Any]] | None = None) -> pandas.DataFrame:
         data = self.response if data is None else data
@@ -86,6 +91,9 @@ class APIPostReportsCleaner(APIResponseCleanerFactory):
 
 class APIGetReportsIdStatusCleaner(APIResponseCleanerFactory):
 
+    completed_states = ("completed",)
+    failed_states = ("failed", "cancelled", "expired")
+
     def check_state(self) -> bool:
         state = self.get_status()
         return self.is_ready_to_download(state)
@@ -94,7 +102,13 @@ class APIGetReportsIdStatusCleaner(APIResponseCleanerFactory):
         return self.response.get("state")
     
     def is_ready_to_download(self, state: str) -> bool:
-        return state == "completed"
+        return state in self.completed_states
+
+    def is_failed(self, state: str) -> bool:
+        return state in self.failed_states
+
+    def is_finished(self, state: str) -> bool:
+        return self.is_ready_to_download(state) or self.is_failed(state)
     
 
 class APIGetReportsIdDataCleaner(APIResponseCleanerFactory):
@@ -106,10 +120,20 @@ class APIGetReportsIdDataCleaner(APIResponseCleanerFactory):
         'country_code',
         'publisher_app_store_id',
         'publisher_name',
-        'ad_format',
         'ad_format'
     )
 
+    csv_string_columns = (
+        'app_id',
+        'campaign_id',
+        'creative_id',
+        'country_code',
+        'publisher_app_store_id',
+        'publisher_name',
+        'ad_format',
+        'event_name'
+    )
+
     def transform_response_to_df(self, data: list[dict[Any]] | None = None) -> pandas.DataFrame:
         data = self.response if data is None else data
         df = pandas.DataFrame(
@@ -118,6 +142,25 @@ class APIGetReportsIdDataCleaner(APIResponseCleanerFactory):
         )
         return df
 
+    def read_csv_response(
+            self,
+            source: Union[str, IO[bytes]],
+            chunksize: Optional[int] = None
+    ) -> Union[pandas.DataFrame, TextFileReader]:
+        """
+        Parses a format="csv" report with the pandas C engine: ids stay strings,
+        metrics are parsed straight into numeric columns. Only empty cells are
+        NA, so e.g. the "NA" country code is kept.
+        """
+        return pandas.read_csv(
+            source,
+            engine="c",
+            chunksize=chunksize,
+            dtype={column: str for column in self.csv_string_columns},
+            keep_default_na=False,
+            na_values=[""]
+        )
+
 
 class APIGetCreativesCleaner(APIResponseCleanerFactory):
 
@@ -0,0 +1,75 @@
+from typing import Optional, Iterable, Any
+
+import pandas
+
+
+class SingleQuoteSanitizer:
+    """
+    Replaces single quotes in the configured string columns. Works in place
+    on DataFrames, column dicts and records, and returns a new Arrow table.
+    Columns without a single quote are detected with one vectorized scan
+    and left untouched; in the others only the affected cells are rewritten.
+    """
+
+    def __init__(
+            self,
+            columns: Iterable[str],
+            old: Optional[str] = "'",
+            new: Optional[str] = " "
+    ) -> None:
+        self.columns = tuple(dict.fromkeys(columns))
+        self.old = old
+        self.new = new
+
+    def sanitize_df(self, df: pandas.DataFrame) -> pandas.DataFrame:
+        for column in self.columns:
+            if column not in df.columns:
+                continue
+            values = df[column]
+            if not (pandas.api.types.is_object_dtype(values) or pandas.api.types.is_string_dtype(values)):
+                continue
+            mask = values.str.contains(self.old, regex=False, na=False)
+            if mask.any():
+                df.loc[mask, column] = values[mask].str.replace(self.old, self.new, regex=False)
+        return df
+
+    def sanitize_columns(self, columns: dict[str, list]) -> dict[str, list]:
+        old, new = self.old, self.new
+        for column in self.columns:
+            values = columns.get(column)
+            if values is None:
+                continue
+            for index, value in enumerate(values):
+                if type(value) is str and old in value:
+                    values[index] = value.replace(old, new)
+        return columns
+
+    def sanitize_record(self, record: dict[str, Any]) -> dict[str, Any]:
+        old, new = self.old, self.new
+        for column in self.columns:
+            value = record.get(column)
+            if type(value) is str and old in value:
+                record[column] = value.replace(old, new)
+        return record
+
+    def sanitize_table(self, table: Any) -> Any:
+        """
+        Same for a pyarrow.Table; pyarrow is imported only here since it is
+        not a dependency of the project.
+        """
+        import pyarrow
+        import pyarrow.compute as compute
+
+        for column in self.columns:
+            index = table.schema.get_field_index(column)
+            if index == -1 or not pyarrow.types.is_string(table.schema.field(index).type):
+                continue
+            values = table.column(index)
+            if not compute.any(compute.match_substring(values, self.old)).as_py():
+                continue
+            table = table.set_column(
+                index,
+                column,
+                compute.replace_substring(values, self.old, self.new)
+            )
+        return table
@@ -1,97 +1,703 @@
-from time import sleep
-import json
+from abc import ABC
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from functools import partial
+from datetime import date, datetime
+from threading import BoundedSemaphore, Lock
+from time import perf_counter, sleep
+from typing import Optional, Union, List, Dict, Any, Callable, Iterable, Iterator
 
+import pandas
+
+from src import config
 from src.app.extractors import liftoff as ex_lift
+from src.app.caches import liftoff as ca_lift
 from src.app.extractors import secret as ex_secret
+from src.app.extractors import watermark as ex_watermark
 from src.app.cleaners import liftoff as cl_lift
 from src.app.enrichers import liftoff as en_lift
 from src.app.loaders import liftoff as ld_lift
+from src.app.pollers import liftoff as pl_lift
+from src.app.planners import liftoff as pn_lift
+from src.app.pipelines import liftoff as pp_lift
+from src.app.metrics import liftoff as mt_lift
+from src.db.sqlite import report_registry
+from src.db.clickhouse import models
 
 
-class ELTReport:
+class StageRunner:
+    """
+    Runs the stage steps of an ELT. This one runs them as they are;
+    MultiAccountELT overrides run_stage to cap the concurrency per stage
+    and submit to run tasks on its shared workers.
+    """
 
-    def test(self) -> None:
-        start_time = "2025-06-01"
-        end_time = "2025-06-23"
+    def run_stage(self, stage: str, func: Callable, *args) -> Any:
+        return func(*args)
 
-        extractor_gen = ex_lift.PostReportsExtractor()
-        response_gen = extractor_gen.get_response(start_time, end_time)
+    def submit(self, func: Callable, *args) -> Future:
+        """
+        Runs the task right away and returns its completed future.
+        """
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
 
-        cleaner_gen = cl_lift.PostReportsCleaner(response_gen.json())
-        report_id = cleaner_gen.get_id_from_response()
-        report_id = "9dfc9c4663d33c42da4c"
-        print("Report ID: ", report_id)
+    def iter_stage(self, stage: str, iterable: Iterable) -> Iterator:
+        """
+        Every next() of the iterator runs as one step of the stage.
+        """
+        iterator = iter(iterable)
+        end = object()
+        while (item := self.run_stage(stage, next, iterator, end)) is not end:
+            yield item
+
+
+class ELTEntityFactory(ABC):
+
+    entity: str = None
+    extractor_class: type[ex_lift.APIExtractorFactory] = None
+    enricher_class: type[en_lift.EnricherFactory] = None
+    loader_class: type[ld_lift.LoaderFactory] = None
+    consolidated_model: type[models.LiftoffConsolidatedModelFactory] = None
+    # the entity streams extract -> enrich -> load batches, see MultiAccountELT.run_pipeline
+    pipelined: bool = True
+
+    def __init__(
+            self,
+            api_key: str,
+            api_secret: Optional[str] = None,
+            secret_provider: Optional[ex_secret.LiftoffSecretProvider] = None,
+            staging_layout: Optional[str] = config.ClickHouseInsert.STAGING_LAYOUT
+    ) -> None:
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.secret_provider = secret_provider
+        self.staging_layout = staging_layout
+        self.loader: Optional[ld_lift.LoaderFactory] = None
+        self.metrics = mt_lift.get_metrics()
+
+    def get_metric_tags(self) -> dict[str, str]:
+        return {"account": self.api_key, "entity": self.entity}
+
+    def get_api_secret(self) -> str:
+        if self.api_secret is None:
+            if self.secret_provider is None:
+                self.secret_provider = ex_secret.get_default_secret_provider()
+            self.api_secret = self.secret_provider.get_api_secret(self.api_key)
+        return self.api_secret
+
+    def extract(self) -> Union[List, Dict]:
+        extractor = self.extractor_class(self.api_key, self.get_api_secret())
+        response = extractor.get_response()
+        response.raise_for_status()
+        return response.json()
+
+    def enrich(self, data: Union[List, Dict]) -> list[Dict]:
+        enricher = self.enricher_class(data, self.api_key)
+        return enricher.enrich_api_response()
+
+    def load(self, data: list[Dict]) -> int:
+        if not data:
+            return 0
+        return self.load_batch(data)
+
+    def is_consolidated(self) -> bool:
+        return self.staging_layout == "consolidated"
+
+    def is_buffered(self) -> bool:
+        """
+        Buffered batches are inserted later together with other accounts,
+        their rows are counted by pop_buffered.
+        """
+        return self.is_consolidated()
+
+    def pop_buffered(self) -> int:
+        """
+        Rows of the account flushed from the shared buffer, raises if an
+        insert holding some of them failed.
+        """
+        if not self.is_buffered():
+            return 0
+        return self.get_loader().pop_account(self.api_key)
+
+    def get_loader(self) -> ld_lift.LoaderFactory:
+        if self.loader is None:
+            if self.is_consolidated():
+                self.loader = ld_lift.get_consolidated_loader(self.consolidated_model)
+            else:
+                self.loader = self.loader_class()
+        return self.loader
+
+    def extract_batches(
+            self,
+            batch_size: Optional[int] = config.Orchestration.BATCH_SIZE
+    ) -> Iterator[List[Dict]]:
+        extractor = self.extractor_class(self.api_key, self.get_api_secret())
+        return self.metrics.iter_stage("extract", extractor.iter_batches(batch_size), **self.get_metric_tags())
+
+    def enrich_batch(self, batch: List[Dict]) -> dict[str, list]:
+        tags = self.get_metric_tags()
+        self.metrics.incr("stage.rows_in", mt_lift.count_rows(batch), stage="enrich", **tags)
+        with self.metrics.timer("stage.seconds", stage="enrich", **tags):
+            enricher = self.enricher_class(batch, self.api_key)
+            enriched = enricher.enrich_to_columns()
+        self.metrics.incr("stage.rows_out", mt_lift.count_rows(enriched), stage="enrich", **tags)
+        return enriched
+
+    def load_batch(self, batch: dict[str, list]) -> int:
+        tags = self.get_metric_tags()
+        self.metrics.incr("stage.rows_in", mt_lift.count_rows(batch), stage="load", **tags)
+        with self.metrics.timer("stage.seconds", stage="load", **tags):
+            loader = self.get_loader()
+            if self.is_consolidated():
+                rows = loader.add_batch(self.api_key, batch, tags)
+            else:
+                rows = loader.load_batch_to_clickhouse(batch, db_name=loader.create_st_liftoff_db_name(self.api_key), tags=tags)
+        self.metrics.incr("stage.rows_out", rows, stage="load", **tags)
+        return rows
+
+    def elt(self) -> int:
+        rows = self.run()
+        ld_lift.flush_consolidated_loaders(raise_errors=False)
+        return rows + self.pop_buffered()
+
+    def run(self, runner: Optional[StageRunner] = None) -> int:
+        """
+        Streams the entity batch by batch: every batch is enriched and
+        inserted before the next one is parsed.
+        """
+        runner = StageRunner() if runner is None else runner
+        rows = 0
+        for batch in runner.iter_stage("extract", self.extract_batches()):
+            enriched = runner.run_stage("enrich", self.enrich_batch, batch)
+            rows += runner.run_stage("load", self.load_batch, enriched)
+        return rows
+
+    @classmethod
+    def prepare_accounts(cls, accounts: tuple[dict[str]]) -> dict[str, dict[str, Any]]:
+        """
+        Extra constructor kwargs per api_key, fetched once for all accounts.
+        """
+        return {}
+
+
+class ELTApp(ELTEntityFactory):
+
+    entity = "app"
+    extractor_class = ex_lift.APIGetAppsExtractor
+    enricher_class = en_lift.GetAppsEnricher
+    loader_class = ld_lift.GetAppsStagingLoader
+    consolidated_model = models.LiftoffConsolidatedAppModel
+
+
+class ELTCampaign(ELTEntityFactory):
 
-        self.check_report_status(report_id)
+    entity = "campaign"
+    extractor_class = ex_lift.APIGetCampaignsExtractor
+    enricher_class = en_lift.GetCampaignsEnricher
+    loader_class = ld_lift.GetCampaignsStagingLoader
+    consolidated_model = models.LiftoffConsolidatedCampaignModel
 
-        extractor_get = ex_lift.GetReportsIdDataExtractor()
-        response_get = extractor_get.get_response(report_id)
 
-        with open("src/app/data/raw_data.json", "w", encoding="utf-8") as file:
-            json.dump(response_get, file, indent=4, ensure_ascii=False, default=str)
+class ELTCreative(ELTEntityFactory):
 
-        enricher_get = en_lift.GetReportsIdDataEnricher(response_get.json())
-        staging_data = enricher_get.enrich_api_response(start_time, end_time)
+    entity = "creative"
+    extractor_class = ex_lift.APIGetCreativesExtractor
+    enricher_class = en_lift.GetCreativesEnricher
+    loader_class = ld_lift.GetCreativesStagingLoader
+    consolidated_model = models.LiftoffConsolidatedCreativeModel
 
-        with open("src/app/data/staging_data.json", "w", encoding="utf-8") as file:
-            json.dump(staging_data, file, indent=4, ensure_ascii=False, default=str)
 
-        loader_get = ld_lift.GetReportsIdDataStagingLoader(staging_data)
-        loader_get.load_data_to_clickhouse()
+class ELTReport(ELTEntityFactory):
 
+    entity = "report"
+    pipelined = False
+    extractor_class = ex_lift.APIGetReportsIdDataExtractor
+    enricher_class = en_lift.GetReportsIdDataEnricher
+    loader_class = ld_lift.GetReportsIdDataStagingLoader
+    consolidated_model = models.LiftoffConsolidatedReportModel
+
+    def __init__(
+            self,
+            api_key: str,
+            api_secret: Optional[str] = None,
+            secret_provider: Optional[ex_secret.LiftoffSecretProvider] = None,
+            staging_layout: Optional[str] = config.ClickHouseInsert.STAGING_LAYOUT,
+            watermark: Optional[date] = None,
+            registry: Optional[report_registry.LiftoffReportRegistry] = None,
+            format: Optional[str] = config.LiftoffApi.PostReports.FORMAT,
+            load_mode: Optional[str] = config.ClickHouseInsert.REPORT_LOAD_MODE,
+            cache: Optional[ca_lift.ResponseCache] = None
+    ) -> None:
+        super().__init__(api_key, api_secret, secret_provider, staging_layout)
+        self.watermark = watermark
+        self.format = format
+        self.load_mode = load_mode
+        self.cache = cache
+        self.registry = report_registry.LiftoffReportRegistry() if registry is None else registry
+
+    def is_buffered(self) -> bool:
+        return super().is_buffered() and self.load_mode != "replace"
+
+    @classmethod
+    def prepare_accounts(cls, accounts: tuple[dict[str]]) -> dict[str, dict[str, Any]]:
+        watermarks = ex_watermark.LiftoffReportWatermarkExtractor().get_watermarks(
+            staging_layout=config.ClickHouseInsert.STAGING_LAYOUT
+        )
+        return {
+            account["api_key"]: {"watermark": watermarks.get(account["api_key"])}
+            for account in accounts
+        }
+
+    def get_period(
+            self,
+            start_time: Optional[str] = None,
+            end_time: Optional[str] = None,
+            lookback_days: Optional[int] = None
+    ) -> tuple[str, str]:
+        """
+        Missing start_time means incremental mode: from the day after the
+        account watermark, minus the restatement lookback. Reloaded days are
+        only replaced in replace mode, so in append mode the lookback is 0
+        and no day is requested twice. Missing end_time means today.
+        """
+        date_format = config.LiftoffApi.PostReports.DATE_REQUEST_FORMAT
+        if lookback_days is None:
+            lookback_days = config.LiftoffApi.PostReports.RESTATEMENT_LOOKBACK_DAYS if self.load_mode == "replace" else 0
+        if start_time is None:
+            start_time = ex_watermark.LiftoffReportWatermarkExtractor.get_start_time(
+                self.watermark,
+                lookback_days
+            )
+        if end_time is None:
+            end_time = date.today().strftime(date_format)
+        return start_time, end_time
+
+    def post_report(
+            self,
+            start_time: str,
+            end_time: str,
+            max_attempts: Optional[int] = config.LiftoffApi.PostReports.POST_MAX_ATTEMPTS,
+            retry_statuses: Optional[tuple[int]] = config.LiftoffApi.PostReports.POST_RETRY_STATUSES
+    ) -> str:
+        """
+        Reuses a registered report for the same request if it is completed or
+        still generating, otherwise posts a new one. The HTTP session never
+        resends a POST, so server errors that mean no report was created are
+        retried here, checking the registry again before every attempt.
+        """
+        extractor = ex_lift.APIPostReportsExtractor(self.api_key, self.get_api_secret())
+        group_by = extractor.default_group_by
+        format = self.format
+        for attempt in range(1, max_attempts + 1):
+            registered = self.registry.find(self.api_key, start_time, end_time, group_by, format)
+            if registered is not None:
+                print(f"The report {registered[0]} is reused, state: {registered[1]}")
+                return registered[0]
+            response = extractor.get_response(start_time, end_time, list(group_by), format)
+            if response.status_code not in retry_statuses or attempt == max_attempts:
+                break
+            print(f"Posting the report {start_time} - {end_time} failed with {response.status_code}, retrying")
+            sleep(config.LiftoffApi.Http.RETRY_BACKOFF_FACTOR * 2 ** (attempt - 1))
+        response.raise_for_status()
+        cleaner = cl_lift.APIPostReportsCleaner(self.api_key, response.json())
+        report_id = cleaner.get_id_from_response()
+        self.registry.register(self.api_key, start_time, end_time, group_by, format, report_id)
+        return report_id
 
     def check_report_status(self, id: str) -> bool:
-        extractor_check = ex_lift.GetReportsIdStatusExtractor()
-        response_check = extractor_check.get_response(id)
+        poller = pl_lift.ReportStatusPoller(self.api_key, self.get_api_secret())
+        state = poller.wait([id])[id]
+        self.registry.update_state(id, state)
+        print(f"The report {id} is {state}")
+        return poller.cleaner.is_ready_to_download(state)
+
+    def get_extractor(self) -> ex_lift.APIGetReportsIdDataExtractor:
+        extractor = self.extractor_class(self.api_key, self.get_api_secret())
+        if self.cache is not None:
+            extractor.set_cache(self.cache)
+        return extractor
+
+    def download_report(self, id: str) -> int:
+        """
+        Streams the report body into the response cache without parsing it,
+        so a later load reads it from disk. Returns the size in bytes.
+        """
+        return sum(len(chunk) for chunk in self.get_extractor().iter_chunks(id))
+
+    def extract(self, id: str) -> Dict:
+        extractor = self.get_extractor()
+        response = extractor.get_response(id)
+        response.raise_for_status()
+        return response.json()
+
+    def extract_batches(
+            self,
+            id: str,
+            batch_size: Optional[int] = config.LiftoffApi.GetReportsIdData.BATCH_SIZE
+    ) -> Iterator[Dict]:
+        extractor = self.get_extractor()
+        return self.metrics.iter_stage("extract", extractor.iter_row_batches(id, batch_size), **self.get_metric_tags())
+
+    def enrich(self, data: Dict, start_time: str, end_time: str) -> list[Dict]:
+        enricher = self.enricher_class(data, self.api_key)
+        return enricher.enrich_api_response(start_time, end_time)
+
+    def load_report_streaming(
+            self,
+            id: str,
+            start_time: str,
+            end_time: str,
+            runner: Optional[StageRunner] = None
+    ) -> int:
+        """
+        Every batch takes the extract, enrich and load limits of the runner
+        in turn, so one long report never holds a stage slot while another
+        stage works on it.
+        """
+        runner = StageRunner() if runner is None else runner
+        loader = self.get_loader()
+        if self.format == "csv":
+            extractor = self.get_extractor()
+            raw_batches = self.metrics.iter_stage("extract", extractor.iter_csv_batches(id), **self.get_metric_tags())
+        else:
+            raw_batches = self.extract_batches(id)
+        batches = (
+            runner.run_stage("enrich", self.enrich_report_batch, batch, start_time, end_time)
+            for batch in runner.iter_stage("extract", raw_batches)
+        )
+        # the batches are pulled lazily by the loader, so the load time is
+        # only observed per insert (clickhouse.insert.seconds)
+        rows = self.load_report_batches(loader, batches, start_time, end_time, partial(runner.run_stage, "load"))
+        self.metrics.incr("stage.rows_out", rows, stage="load", **self.get_metric_tags())
+        return rows
+
+    def enrich_report_batch(
+            self,
+            batch: Union[Dict, pandas.DataFrame],
+            start_time: str,
+            end_time: str
+    ) -> Union[dict[str, list], pandas.DataFrame]:
+        tags = self.get_metric_tags()
+        with self.metrics.timer("stage.seconds", stage="enrich", **tags):
+            enricher = self.enricher_class(None, self.api_key)
+            if isinstance(batch, pandas.DataFrame):
+                enriched = enricher.enrich_df(batch, start_time, end_time)
+            else:
+                enriched = enricher.enrich_to_columns(start_time, end_time, data=batch)
+        self.metrics.incr("stage.rows_out", mt_lift.count_rows(enriched), stage="enrich", **tags)
+        return enriched
 
-        cleaner_check = cl_lift.GetReportsIdStatusCleaner(response_check.json())
-        is_completed = cleaner_check.check_state()
+    def load_report_batches(
+            self,
+            loader: ld_lift.LoaderFactory,
+            batches: Iterable[Union[dict[str, list], pandas.DataFrame]],
+            start_time: str,
+            end_time: str,
+            run_load: Optional[Callable[..., Any]] = None
+    ) -> int:
+        run_load = ld_lift.run_directly if run_load is None else run_load
+        tags = self.get_metric_tags()
+        if self.load_mode == "replace":
+            date_format = config.LiftoffApi.PostReports.DATE_REQUEST_FORMAT
+            start, end = (datetime.strptime(value, date_format).date() for value in (start_time, end_time))
+            if self.is_consolidated():
+                return loader.replace_window_in_clickhouse(
+                    batches,
+                    start,
+                    end,
+                    api_key=self.api_key,
+                    run_load=run_load,
+                    tags=tags
+                )
+            return loader.replace_window_in_clickhouse(
+                batches,
+                start,
+                end,
+                db_name=loader.create_st_liftoff_db_name(self.api_key),
+                run_load=run_load,
+                tags=tags
+            )
+        if self.is_consolidated():
+            return sum(run_load(loader.add_batch, self.api_key, batch, tags) for batch in batches)
+        return loader.load_batches_to_clickhouse(
+            batches,
+            db_name=loader.create_st_liftoff_db_name(self.api_key),
+            run_load=run_load,
+            tags=tags
+        )
 
-        if not is_completed:
-            print("The report isn't ready")
-            sleep(5)
-            return self.check_report_status(id)
+    def elt(
+            self,
+            start_time: Optional[str] = None,
+            end_time: Optional[str] = None,
+            stream: Optional[bool] = True
+    ) -> int:
+        start_time, end_time = self.get_period(start_time, end_time)
+        report_id = self.post_report(start_time, end_time)
+        print("Report ID: ", report_id)
+        if not self.check_report_status(report_id):
+            raise RuntimeError(f"The report {report_id} failed")
+        if stream or self.format == "csv":
+            rows = self.load_report_streaming(report_id, start_time, end_time)
         else:
-            print("The report is ready")
-            return True
-        
+            # one batch through the same load path, so replace mode replaces here too
+            enriched = self.enrich(self.extract(report_id), start_time, end_time)
+            rows = self.load_report_batches(self.get_loader(), [enriched], start_time, end_time)
+        ld_lift.flush_consolidated_loaders(raise_errors=False)
+        return rows + self.pop_buffered()
+
+    def elt_windows(
+            self,
+            start_time: str,
+            end_time: str,
+            window_days: Optional[int] = config.LiftoffApi.PostReports.WINDOW_DAYS,
+            max_attempts: Optional[int] = config.LiftoffApi.PostReports.WINDOW_MAX_ATTEMPTS,
+            runner: Optional[StageRunner] = None
+    ) -> dict[tuple[str, str], int]:
+        """
+        Posts one report per date window, polls them together and loads every
+        window as soon as its report is ready. Only the failed windows are
+        posted again, up to max_attempts times. Every post takes an extract
+        slot of the runner and the loads take theirs per batch, while the
+        polling holds none. Posts and loads are submitted to the runner, so
+        all accounts share its workers and stage limits.
+        """
+        runner = StageRunner() if runner is None else runner
+        windows = pn_lift.ReportWindowPlanner(window_days).split(start_time, end_time)
+        poller = pl_lift.ReportStatusPoller(self.api_key, self.get_api_secret())
+        loaded = {}
+        errors = {}
+        for attempt in range(1, max_attempts + 1):
+            pending = [window for window in windows if window not in loaded]
+            if not pending:
+                break
+            report_windows = {}
+            posts = [(window, runner.submit(runner.run_stage, "extract", self.post_report, *window)) for window in pending]
+            for window, future in posts:
+                try:
+                    report_windows[future.result()] = window
+                except Exception as error:
+                    errors[window] = error
+            loads = {}
+            polled = set()
+            try:
+                for id, state in poller.iter_finished(report_windows):
+                    polled.add(id)
+                    self.registry.update_state(id, state)
+                    window = report_windows[id]
+                    if poller.cleaner.is_ready_to_download(state):
+                        loads[window] = runner.submit(self.load_report_streaming, id, *window, runner)
+                    else:
+                        errors[window] = RuntimeError(f"The report {id} is {state}")
+            except Exception as error:
+                # the polling timed out or a status request failed for good: the
+                # windows not polled yet fail this attempt, the loads go on
+                for id, window in report_windows.items():
+                    if id not in polled:
+                        errors[window] = error
+            for window, future in loads.items():
+                try:
+                    loaded[window] = future.result()
+                    errors.pop(window, None)
+                except Exception as error:
+                    errors[window] = error
+            print(f"Attempt {attempt}: {len(loaded)} of {len(windows)} windows are loaded")
+        failed = {window: error for window, error in errors.items() if window not in loaded}
+        if failed:
+            raise RuntimeError(f"Report windows of {self.api_key} failed: {failed}")
+        return loaded
+
+    def run(self, runner: Optional[StageRunner] = None) -> int:
+        runner = StageRunner() if runner is None else runner
+        start_time, end_time = self.get_period()
+        loaded = self.elt_windows(start_time, end_time, runner=runner)
+        return sum(loaded.values())
+
+
+ELT_CLASSES: dict[str, type[ELTEntityFactory]] = {
+    elt_class.entity: elt_class for elt_class in (ELTApp, ELTCampaign, ELTCreative, ELTReport)
+}
+
+
+@dataclass
+class AccountELTResult:
+    api_key: str
+    entity: str
+    status: str = "pending"
+    rows: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+class MultiAccountELT(StageRunner):
+    """
+    Runs extract -> enrich -> load for every (account, entity) pair on a bounded
+    thread pool. Each stage additionally has its own concurrency limit, so e.g.
+    many downloads can be in flight while only a couple of inserts run at once.
+    """
+
+    def __init__(
+            self,
+            elt_classes: Optional[tuple[type[ELTEntityFactory]]] = None,
+            max_workers: Optional[int] = config.Orchestration.MAX_WORKERS,
+            stage_limits: Optional[dict[str, int]] = None,
+            secret_provider: Optional[ex_secret.LiftoffSecretProvider] = None
+    ) -> None:
+        self.elt_classes = (ELTApp, ELTCampaign, ELTCreative) if elt_classes is None else elt_classes
+        self.max_workers = max_workers
+        stage_limits = config.Orchestration.STAGE_LIMITS if stage_limits is None else stage_limits
+        self.stage_limits = stage_limits
+        self.stage_semaphores = {
+            stage: BoundedSemaphore(limit) for stage, limit in stage_limits.items()
+        }
+        self.secret_provider = ex_secret.get_default_secret_provider() if secret_provider is None else secret_provider
+        self.task_executor: Optional[ThreadPoolExecutor] = None
+
+    def get_accounts(self) -> tuple[dict[str]]:
+        return self.secret_provider.get_accounts()
+
+    def run_stage(self, stage: str, func: Callable, *args) -> Any:
+        with self.stage_semaphores[stage]:
+            return func(*args)
+
+    def submit(self, func: Callable, *args) -> Future:
+        """
+        Runs the task on the workers shared by all accounts, e.g. the report
+        windows of ELTReport. The tasks never wait for other tasks, so this
+        pool is separate from the one running whole ELTs.
+        """
+        if self.task_executor is None:
+            return super().submit(func, *args)
+        return self.task_executor.submit(func, *args)
 
-class ELTApp:
+    def run_one(self, elt: ELTEntityFactory) -> AccountELTResult:
+        result = AccountELTResult(api_key=elt.api_key, entity=elt.entity)
+        started = perf_counter()
+        try:
+            result.rows = elt.run(self)
+            result.status = "success"
+        except Exception as error:
+            result.status = "failed"
+            result.error = f"{type(error).__name__}: {error}"
+        result.seconds = round(perf_counter() - started, 3)
+        return result
 
-    def elt(self) -> None:
-        extractor = ex_lift.GetAppsExtractor()
-        response_raw = extractor.get_response()
+    def run(self, accounts: Optional[tuple[dict[str]]] = None) -> dict[str, list[AccountELTResult]]:
+        """
+        Pipelined entities of all accounts share one staged pipeline, so
+        downloading one account overlaps with enriching and loading the
+        others; the rest run whole in the thread pool meanwhile.
+        """
+        accounts = self.get_accounts() if accounts is None else accounts
+        summary = {account["api_key"]: [] for account in accounts}
+        elt_kwargs = {elt_class: elt_class.prepare_accounts(accounts) for elt_class in self.elt_classes}
+        elts = [
+            elt_class(
+                account["api_key"],
+                account["api_secret"],
+                **elt_kwargs[elt_class].get(account["api_key"], {})
+            )
+            for account in accounts
+            for elt_class in self.elt_classes
+        ]
+        # every task holds at most one stage slot at a time, so this many
+        # workers keep all stage limits busy
+        task_workers = sum(self.stage_limits.values())
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor, \
+                ThreadPoolExecutor(max_workers=task_workers) as self.task_executor:
+            futures = {executor.submit(self.run_one, elt): elt for elt in elts if not elt.pipelined}
+            pipelined = [elt for elt in elts if elt.pipelined]
+            results = list(zip(pipelined, self.run_pipeline(pipelined)))
+            for future in as_completed(futures):
+                results.append((futures[future], future.result()))
+        self.task_executor = None
+        flushed = ld_lift.flush_consolidated_loaders(raise_errors=False)
+        if flushed:
+            print(f"{flushed} buffered rows are loaded into the consolidated tables")
+        for elt, result in results:
+            try:
+                result.rows += elt.pop_buffered()
+            except Exception as error:
+                result.status = "failed"
+                result.error = f"{type(error).__name__}: {error}"
+            summary[result.api_key].append(result)
+        mt_lift.get_metrics().flush()
+        return summary
 
-        enricher = en_lift.GetAppsEnricher(response_raw.json())
-        response_enriched = enricher.enrich_api_response()
+    def run_pipeline(self, elts: list[ELTEntityFactory]) -> list[AccountELTResult]:
+        if not elts:
+            return []
+        results = {id(elt): AccountELTResult(api_key=elt.api_key, entity=elt.entity) for elt in elts}
+        started = {}
+        lock = Lock()
 
-        loader = ld_lift.GetAppsStagingLoader(response_enriched)
-        loader.load_data_to_clickhouse()
+        def extract(elt: ELTEntityFactory) -> Iterator[tuple[ELTEntityFactory, Any]]:
+            started[id(elt)] = perf_counter()
+            for batch in self.iter_stage("extract", elt.extract_batches()):
+                if results[id(elt)].status == "failed":
+                    return
+                yield elt, batch
+            finish(elt)
 
+        def enrich(item: tuple[ELTEntityFactory, Any]) -> Optional[tuple[ELTEntityFactory, Any]]:
+            elt, batch = item
+            if results[id(elt)].status == "failed":
+                return None
+            return elt, self.run_stage("enrich", elt.enrich_batch, batch)
 
-class ELTCampaign:
+        def load(item: tuple[ELTEntityFactory, Any]) -> None:
+            elt, batch = item
+            if results[id(elt)].status == "failed":
+                return
+            rows = self.run_stage("load", elt.load_batch, batch)
+            with lock:
+                results[id(elt)].rows += rows
+            finish(elt)
 
-    def elt(self) -> None:
-        api_key = "60d83c8c0e"
-        extractor_secret = ex_secret.LiftoffSecretExtractor()
-        api_secret = extractor_secret.get_api_secret_by_api_key(api_key)
-        print(78)
+        def finish(elt: ELTEntityFactory) -> None:
+            with lock:
+                result = results[id(elt)]
+                result.seconds = round(perf_counter() - started[id(elt)], 3)
 
-        extractor_api = ex_lift.GetCampaignsExtractor(api_key, api_secret)
-        response_raw = extractor_api.get_response()
-        print(82)
+        def fail(stage: str, item: Any, error: Exception) -> None:
+            elt = item if isinstance(item, ELTEntityFactory) else item[0]
+            with lock:
+                result = results[id(elt)]
+                result.status = "failed"
+                result.error = f"{stage}: {type(error).__name__}: {error}"
 
-        enricher = en_lift.GetCampaignsEnricher(response_raw.json())
-        response_enriched = enricher.enrich_api_response()
+        pipeline = pp_lift.StagedPipeline(
+            [
+                pp_lift.PipelineStage("extract", extract, self.stage_limits["extract"], flat=True),
+                pp_lift.PipelineStage("enrich", enrich, self.stage_limits["enrich"]),
+                pp_lift.PipelineStage("load", load, self.stage_limits["load"]),
+            ],
+            on_error=fail
+        )
+        pipeline.run(elts)
+        for result in results.values():
+            if result.status != "failed":
+                result.status = "success"
+        return list(results.values())
 
-        loader = ld_lift.GetCampaignsStagingLoader(response_enriched)
-        db_name = loader.create_st_liftoff_db_name(api_key)
-        loader.load_data_to_clickhouse(db_name=db_name)
+    def print_summary(self, summary: dict[str, list[AccountELTResult]]) -> None:
+        for api_key, results in summary.items():
+            for result in sorted(results, key=lambda item: item.entity):
+                line = f"{api_key} {result.entity}: {result.status}, rows={result.rows}, {result.seconds}s"
+                if result.error is not None:
+                    line += f", error={result.error}"
+                print(line)
 
 
 def main() -> None:
-    elt = ELTCampaign()
-    elt.elt()
+    elt = MultiAccountELT()
+    summary = elt.run()
+    elt.print_summary(summary)
 
 
 if __name__ == "__main__":
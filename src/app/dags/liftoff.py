@@ -0,0 +1,132 @@
+from typing import Optional, Any
+from datetime import datetime
+
+from airflow.configuration import conf
+from airflow.sdk import DAG, Param, dag, task, task_group
+
+from src import config
+from src.app import custom_orchestrator as orchestrator
+from src.app.caches import liftoff as ca_lift
+from src.app.extractors import secret as ex_secret
+from src.app.loaders import liftoff as ld_lift
+from src.app.operators import liftoff as op_lift
+from src.app.planners import liftoff as pn_lift
+
+
+def create_liftoff_elt_dag(
+        dag_id: Optional[str] = "liftoff_elt",
+        schedule: Optional[str] = config.Airflow.SCHEDULE,
+        dimension_entities: Optional[tuple[str]] = config.Airflow.DIMENSION_ENTITIES,
+        include_reports: Optional[bool] = True,
+        liftoff_api_pool: Optional[str] = config.Airflow.LIFTOFF_API_POOL,
+        clickhouse_pool: Optional[str] = config.Airflow.CLICKHOUSE_POOL,
+        report_windows_per_task: Optional[int] = config.Airflow.REPORT_WINDOWS_PER_TASK,
+        report_cache_directory: Optional[str] = config.Airflow.REPORT_CACHE_DIRECTORY
+) -> DAG:
+    """
+    Builds a DAG that reads the accounts from the secret table at run time
+    and maps one task per (account x dimension entity) and one task group
+    per account and consecutive report windows: post the reports, wait for
+    them deferred in the triggerer, download them, load them. The windows
+    per group grow until the groups fit into [core] max_map_length. Liftoff
+    calls, report downloads included, run in liftoff_api_pool and the loads
+    read the downloaded reports from report_cache_directory in
+    clickhouse_pool, so the pools cap the load on both sides however many
+    Celery workers pick the tasks up.
+    Only api keys travel through XCom, secrets are resolved in the tasks.
+    """
+
+    @dag(
+        dag_id=dag_id,
+        schedule=schedule,
+        start_date=datetime.strptime(
+            config.LiftoffApi.PostReports.DEFAULT_START_TIME,
+            config.LiftoffApi.PostReports.DATE_REQUEST_FORMAT
+        ),
+        catchup=False,
+        max_active_runs=1,
+        params={
+            # empty start_time means incremental mode from the account watermark
+            "start_time": Param(None, type=["null", "string"], format="date"),
+            "end_time": Param(None, type=["null", "string"], format="date"),
+        },
+        tags=["liftoff"]
+    )
+    def liftoff_elt() -> None:
+
+        @task
+        def get_api_keys() -> list[str]:
+            provider = ex_secret.get_default_secret_provider()
+            return [account["api_key"] for account in provider.get_accounts()]
+
+        @task
+        def plan_dimension_units(api_keys: list[str]) -> list[dict[str, str]]:
+            return [
+                {"api_key": api_key, "entity": entity}
+                for api_key in api_keys
+                for entity in dimension_entities
+            ]
+
+        @task(pool=liftoff_api_pool)
+        def run_dimension_unit(unit: dict[str, str]) -> int:
+            elt = orchestrator.ELT_CLASSES[unit["entity"]](unit["api_key"])
+            return elt.elt()
+
+        @task
+        def plan_report_units(api_keys: list[str], params: Optional[dict[str, Any]] = None) -> list[dict[str, Any]]:
+            params = {} if params is None else params
+            accounts = tuple({"api_key": api_key} for api_key in api_keys)
+            account_kwargs = orchestrator.ELTReport.prepare_accounts(accounts)
+            planner = pn_lift.ReportWindowPlanner()
+            windows = {}
+            for api_key in api_keys:
+                elt = orchestrator.ELTReport(api_key, **account_kwargs.get(api_key, {}))
+                start_time, end_time = elt.get_period(params.get("start_time"), params.get("end_time"))
+                windows[api_key] = planner.split(start_time, end_time)
+            groups = pn_lift.group_windows(windows, conf.getint("core", "max_map_length"), report_windows_per_task)
+            return [{"api_key": api_key, "windows": account_windows} for api_key, account_windows in groups]
+
+        @task(pool=liftoff_api_pool, multiple_outputs=True)
+        def post_report(unit: dict[str, Any]) -> dict[str, Any]:
+            elt = orchestrator.ELTReport(unit["api_key"])
+            report_ids = [elt.post_report(start_time, end_time) for start_time, end_time in unit["windows"]]
+            return {**unit, "report_ids": report_ids}
+
+        @task(pool=liftoff_api_pool)
+        def download_report(unit: dict[str, Any], report_ids: list[str]) -> int:
+            elt = orchestrator.ELTReport(unit["api_key"], cache=ca_lift.ResponseCache(report_cache_directory))
+            size = 0
+            for report_id in report_ids:
+                elt.registry.update_state(report_id, "completed")
+                size += elt.download_report(report_id)
+            return size
+
+        @task(pool=clickhouse_pool)
+        def load_report(unit: dict[str, Any], report_ids: list[str]) -> int:
+            # a report missing from the cache, e.g. evicted, is downloaded again
+            elt = orchestrator.ELTReport(unit["api_key"], cache=ca_lift.ResponseCache(report_cache_directory))
+            rows = 0
+            for (start_time, end_time), report_id in zip(unit["windows"], report_ids):
+                rows += elt.load_report_streaming(report_id, start_time, end_time)
+            ld_lift.flush_consolidated_loaders(raise_errors=False)
+            return rows + elt.pop_buffered()
+
+        @task_group
+        def report_window(unit: dict[str, Any]) -> None:
+            posted = post_report(unit)
+            wait = op_lift.LiftoffReportStatusSensor(
+                task_id="wait_report",
+                api_key=posted["api_key"],
+                report_ids=posted["report_ids"]
+            )
+            downloaded = download_report(unit, posted["report_ids"])
+            loaded = load_report(unit, posted["report_ids"])
+            wait >> downloaded >> loaded
+
+        api_keys = get_api_keys()
+        if dimension_entities:
+            run_dimension_unit.expand(unit=plan_dimension_units(api_keys))
+        if include_reports:
+            report_window.expand(unit=plan_report_units(api_keys))
+
+    return liftoff_elt()
@@ -1,27 +1,77 @@
 from abc import ABC, abstractmethod
-from typing import Union, List, Dict, Any, Optional
-from uuid import uuid4
+from typing import Union, List, Dict, Any, Optional, Iterable, Iterator, Sequence
+from uuid import UUID
 from datetime import datetime
+import hashlib
 import json
 
+import pandas
 import pytz
 
 from src import config
+from src.app.enrichers import mapping
+from src.app.cleaners.sanitizer import SingleQuoteSanitizer
+
+
+ROW_ID_PERSON = b"liftoff-row-id"
+ROW_ID_NULL = b"\x00"
+ROW_ID_VALUE = b"\x01"
 
 
 class EnricherFactory(ABC):
 
+    # natural key of a staging row, besides api_key
+    row_id_columns: tuple[str] = ()
+
     def __init__(
             self,
-            data: Union[List, Dict]
+            data: Union[List, Dict],
+            api_key: Optional[str] = None
     ) -> None:
         super().__init__()
         self.data = data
+        self.api_key = api_key
+
+    def create_row_ids(self, key_columns: dict[str, Sequence]) -> list[UUID]:
+        """
+        Deterministic row ids: a 128-bit BLAKE2b of (api_key, *natural key),
+        so a re-run produces the same ids and ReplacingMergeTree can
+        collapse the duplicates.
+        """
+        return [self.create_row_id(values) for values in zip(*key_columns.values())]
+
+    def create_row_id(self, values: Iterable[Any]) -> UUID:
+        """
+        Every value is written as a null marker or as its length-prefixed
+        str(), so None differs from "" and the id does not depend on how a
+        library hashes or serializes values.
+        """
+        parts = []
+        for value in (self.api_key, *values):
+            # value != value is only true for NaN
+            if value is None or value is pandas.NA or value is pandas.NaT or value != value:
+                parts.append(ROW_ID_NULL)
+            else:
+                encoded = str(value).encode("utf-8")
+                parts += (ROW_ID_VALUE, len(encoded).to_bytes(4, "big"), encoded)
+        return UUID(bytes=hashlib.blake2b(b"".join(parts), digest_size=16, person=ROW_ID_PERSON).digest())
 
     @abstractmethod
     def enrich_api_response(self):
         pass
 
+    @abstractmethod
+    def enrich_to_columns(self):
+        pass
+
+    def enrich_batches(self, batches: Iterable[Union[List, Dict]], *args, **kwargs) -> Iterator[List[Dict]]:
+        for batch in batches:
+            yield self.enrich_api_response(*args, data=batch, **kwargs)
+
+    def enrich_batches_to_columns(self, batches: Iterable[Union[List, Dict]], *args, **kwargs) -> Iterator[dict[str, list]]:
+        for batch in batches:
+            yield self.enrich_to_columns(*args, data=batch, **kwargs)
+
     def save_data_to_local_storage(self, data: Union[List, Dict], path: str) -> None:
         with open(path, "r", encoding="utf-8") as file:
             json.dump(data, file, indent=4, ensure_ascii=False, default=str)
@@ -31,9 +81,7 @@ class EnricherFactory(ABC):
             input_dict: dict[Any],
             columns: list[str]
     ) -> dict[Any]:
-        for column in columns:
-            input_dict[column] = self.replace_single_quote(input_dict[column])
-        return input_dict
+        return SingleQuoteSanitizer(columns).sanitize_record(input_dict)
     
     def replace_single_quote(
             self,
@@ -45,108 +93,233 @@ class EnricherFactory(ABC):
 
 class GetReportsIdDataEnricher(EnricherFactory):
 
+    row_id_columns = (
+        "date",
+        "app_id",
+        "campaign_id",
+        "creative_id",
+        "country_code",
+        "publisher_app_store_id",
+        "publisher_name",
+        "ad_format",
+        "is_interstitial",
+        "event_name",
+    )
+
+    # staging column -> report column
+    report_columns = {
+        "date": "date",
+        "app_id": "app_id",
+        "campaign_id": "campaign_id",
+        "creative_id": "creative_id",
+        "country_code": "country_code",
+        "publisher_app_store_id": "publisher_app_store_id",
+        "publisher_name": "publisher_name",
+        "ad_format": "ad_format",
+        "is_interstitial": "is_interstitial",
+        "video_starts": "video_starts",
+        "video_plays_at_25_percent": "video_plays_at_25_percent",
+        "video_plays_at_50_percent": "video_plays_at_50_percent",
+        "video_plays_at_75_percent": "video_plays_at_75_percent",
+        "video_completes": "video_completes",
+        "spend": "spend",
+        "impressions": "impressions",
+        "clicks": "clicks",
+        "installs": "installs",
+        "event_name": "event_name",
+        "cpm": "cpm",
+        "cpc": "cpc",
+        "ctr": "ctr",
+        "cpi": "cpi",
+        "cpa": "cpa",
+        "skan_installs_with_no_conversion_value": "skan-installs-with-no-conversion-value",
+        "skan_installs_with_conversion_value": "skan-installs-with-conversion-value",
+    }
+
     def enrich_api_response(
             self,
             start_time: str, # example: "2020-10-01"
             end_time: str, # example: "2020-11-01"
-            date_format: Optional[str] = config.LiftoffApi.PostReports.DATE_REQUEST_FORMAT
-    ) -> tuple[List, List]:
-        columns = self.data.get("columns")
+            date_format: Optional[str] = config.LiftoffApi.PostReports.DATE_REQUEST_FORMAT,
+            data: Optional[Dict] = None
+    ) -> List[Dict]:
+        return mapping.columns_to_records(self.enrich_to_columns(start_time, end_time, date_format, data))
+
+    def enrich_to_columns(
+            self,
+            start_time: str, # example: "2020-10-01"
+            end_time: str, # example: "2020-11-01"
+            date_format: Optional[str] = config.LiftoffApi.PostReports.DATE_REQUEST_FORMAT,
+            data: Optional[Dict] = None
+    ) -> dict[str, list]:
+        """
+        Maps the response header to the staging schema once and builds the
+        staging columns from the transposed rows, so the cost is linear in
+        rows x columns.
+        """
+        data = self.data if data is None else data
+        columns = data.get("columns")
+        rows = data["rows"]
+        size = len(rows)
         start_time_obj = datetime.strptime(start_time, date_format).date()
         end_time_obj = datetime.strptime(end_time, date_format).date()
         now = datetime.now(tz=pytz.timezone(config.DEFAULT_TZ))
-        records = []
-        for row in self.data["rows"]:
-            record = {
-                "id": uuid4(),
-                "start_time": start_time_obj,
-                "end_time": end_time_obj,
-                "date": datetime.strptime(row[columns.index("date")], config.LiftoffApi.GetReportsIdData.DATE_RESPONSE_FORMAT).date() if "date" in columns else None,
-                "app_id": row[columns.index("app_id")] if "app_id" in columns else None,
-                "campaign_id": row[columns.index("campaign_id")] if "campaign_id" in columns else None,
-                "creative_id": row[columns.index("creative_id")] if "creative_id" in columns else None,
-                "country_code": row[columns.index("country_code")] if "country_code" in columns else None,
-                "publisher_app_store_id": row[columns.index("publisher_app_store_id")] if "publisher_app_store_id" in columns else None,
-                "publisher_name": row[columns.index("publisher_name")] if "publisher_name" in columns else None,
-                "ad_format": row[columns.index("ad_format")] if "ad_format" in columns else None,
-                "is_interstitial": row[columns.index("is_interstitial")] if "is_interstitial" in columns else None,
-                "video_starts": row[columns.index("video_starts")] if "video_starts" in columns else None,
-                "video_plays_at_25_percent": row[columns.index("video_plays_at_25_percent")] if "video_plays_at_25_percent" in columns else None,
-                "video_plays_at_50_percent": row[columns.index("video_plays_at_50_percent")] if "video_plays_at_50_percent" in columns else None,
-                "video_plays_at_75_percent": row[columns.index("video_plays_at_75_percent")] if "video_plays_at_75_percent" in columns else None,
-                "video_completes": row[columns.index("video_completes")] if "video_completes" in columns else None,
-                "spend": row[columns.index("spend")] if "spend" in columns else None,
-                "impressions": row[columns.index("impressions")] if "impressions" in columns else None,
-                "clicks": row[columns.index("clicks")] if "clicks" in columns else None,
-                "installs": row[columns.index("installs")] if "installs" in columns else None,
-                "event_name": row[columns.index("event_name")] if "event_name" in columns else None,
-                "cpm": row[columns.index("cpm")] if "cpm" in columns else None,
-                "cpc": row[columns.index("cpc")] if "cpc" in columns else None,
-                "ctr": row[columns.index("ctr")] if "ctr" in columns else None,
-                "cpi": row[columns.index("cpi")] if "cpi" in columns else None,
-                "cpa": row[columns.index("cpa")] if "cpa" in columns else None,
-                "skan_installs_with_no_conversion_value": row[columns.index("skan-installs-with-no-conversion-value")] if "skan-installs-with-no-conversion-value" in columns else None,
-                "skan_installs_with_conversion_value": row[columns.index("skan-installs-with-conversion-value")] if "skan-installs-with-conversion-value" in columns else None,
-                "created": now,
-                "updated": now
-            }
-            records.append(record)
-        return records
-
-
-class GetAppsEnricher(EnricherFactory):
+        positions = {column: index for index, column in enumerate(columns)}
+        transposed = list(zip(*rows)) if size else [() for _ in columns]
+        enriched = {
+            "id": None,
+            "start_time": [start_time_obj] * size,
+            "end_time": [end_time_obj] * size,
+        }
+        for staging_column, report_column in self.report_columns.items():
+            if report_column not in positions:
+                enriched[staging_column] = [None] * size
+            elif staging_column == "date":
+                enriched[staging_column] = self.parse_dates(transposed[positions[report_column]])
+            else:
+                enriched[staging_column] = list(transposed[positions[report_column]])
+        enriched["id"] = self.create_row_ids({column: enriched[column] for column in self.row_id_columns})
+        enriched["created"] = [now] * size
+        enriched["updated"] = [now] * size
+        return enriched
 
-    def enrich_api_response(self):
+    def enrich_to_df(
+            self,
+            start_time: str,
+            end_time: str,
+            date_format: Optional[str] = config.LiftoffApi.PostReports.DATE_REQUEST_FORMAT,
+            data: Optional[Dict] = None
+    ) -> pandas.DataFrame:
+        return pandas.DataFrame(self.enrich_to_columns(start_time, end_time, date_format, data))
+
+    def parse_dates(
+            self,
+            values: tuple[str],
+            date_format: Optional[str] = config.LiftoffApi.GetReportsIdData.DATE_RESPONSE_FORMAT
+    ) -> list:
+        if not values:
+            return []
+        return pandas.to_datetime(pandas.Series(values), format=date_format).dt.date.tolist()
+
+    def enrich_batches_to_df(
+            self,
+            batches: Iterable[Dict],
+            start_time: str,
+            end_time: str
+    ) -> Iterator[pandas.DataFrame]:
+        for batch in batches:
+            yield self.enrich_to_df(start_time, end_time, data=batch)
+
+    def enrich_df(
+            self,
+            df: pandas.DataFrame,
+            start_time: str, # example: "2020-10-01"
+            end_time: str, # example: "2020-11-01"
+            date_format: Optional[str] = config.LiftoffApi.PostReports.DATE_REQUEST_FORMAT
+    ) -> pandas.DataFrame:
+        """
+        Column-wise enrichment of a parsed CSV report: renames the report
+        columns to the staging ones, fills the missing ones with None and
+        parses date in one pass.
+        """
         now = datetime.now(tz=pytz.timezone(config.DEFAULT_TZ))
-        records = []
-        for row in self.data:
-            record = {
-                "id": uuid4(),
-                "app_id": row.get("id"),
-                "name": row.get("name"),
-                "app_store_id": row.get("app_store_id"),
-                "bundle_id": row.get("bundle_id"),
-                "title": row.get("title"),
-                "platform": row.get("platform"),
-                "optimization_event_id": row.get("optimization_event").get("id"),
-                "optimization_event_name": row.get("optimization_event").get("name"),
-                "state": row.get("state"),
-                "created": now,
-                "updated": now
-            }
-            records.append(record)
-        return records
-    
+        size = len(df)
+        enriched = {
+            "id": None,
+            "start_time": datetime.strptime(start_time, date_format).date(),
+            "end_time": datetime.strptime(end_time, date_format).date(),
+        }
+        for staging_column, report_column in self.report_columns.items():
+            if report_column not in df.columns:
+                enriched[staging_column] = None
+            elif staging_column == "date":
+                enriched[staging_column] = pandas.to_datetime(
+                    df[report_column],
+                    format=config.LiftoffApi.GetReportsIdData.DATE_RESPONSE_FORMAT
+                ).dt.date
+            elif df[report_column].dtype == object:
+                enriched[staging_column] = df[report_column].where(df[report_column].notna(), None)
+            else:
+                enriched[staging_column] = df[report_column]
+        enriched["id"] = self.create_row_ids({
+            column: enriched[column] if enriched[column] is not None else [None] * size
+            for column in self.row_id_columns
+        })
+        enriched["created"] = now
+        enriched["updated"] = now
+        return pandas.DataFrame(enriched, index=df.index).reset_index(drop=True)
 
-class GetCreativesEnricher(EnricherFactory):
+    def enrich_df_batches(
+            self,
+            batches: Iterable[pandas.DataFrame],
+            start_time: str,
+            end_time: str
+    ) -> Iterator[pandas.DataFrame]:
+        for batch in batches:
+            yield self.enrich_df(batch, start_time, end_time)
 
-    def enrich_api_response(self):
+
+class DimensionEnricherFactory(EnricherFactory):
+
+    spec: mapping.EntitySpec = None
+
+    def enrich_api_response(self, data: Optional[List[Dict]] = None) -> List[Dict]:
+        return mapping.columns_to_records(self.enrich_to_columns(data))
+
+    def enrich_to_columns(self, data: Optional[List[Dict]] = None) -> dict[str, list]:
+        data = self.data if data is None else data
         now = datetime.now(tz=pytz.timezone(config.DEFAULT_TZ))
-        for row in self.data:
-            row["creative_id"] = row["id"]
-            row["id"] = uuid4()
-            row["name"] = None if "name" not in row else row["name"]
-            row["preview_url"] = None if "preview_url" not in row else row["preview_url"]
-            row["full_html_preview_url"] = None if "full_html_preview_url" not in row else row["full_html_preview_url"]
-            row["width"] = None if "width" not in row else row["width"]
-            row["height"] = None if "height" not in row else row["height"]
-            row["video_duration"] = None if "video_duration" not in row else row["video_duration"]
-            row["video_url"] = None if "video_url" not in row else row["video_url"]
-            row["created"] = now
-            row["updated"] = now
-        return self.data
+        columns = self.spec.apply(data)
+        ids = self.create_row_ids({column: columns[column] for column in self.row_id_columns})
+        return {
+            "id": ids,
+            **columns,
+            "created": [now] * len(ids),
+            "updated": [now] * len(ids)
+        }
+
+
+class GetAppsEnricher(DimensionEnricherFactory):
+
+    row_id_columns = ("app_id",)
+    spec = mapping.EntitySpec([
+        mapping.FieldSpec("app_id", "id"),
+        mapping.FieldSpec("name"),
+        mapping.FieldSpec("app_store_id"),
+        mapping.FieldSpec("bundle_id"),
+        mapping.FieldSpec("title"),
+        mapping.FieldSpec("platform"),
+        mapping.FieldSpec("optimization_event_id", "optimization_event.id"),
+        mapping.FieldSpec("optimization_event_name", "optimization_event.name"),
+        mapping.FieldSpec("state"),
+    ])
     
 
-class GetCampaignsEnricher(EnricherFactory):
+class GetCreativesEnricher(DimensionEnricherFactory):
 
-    def enrich_api_response(self) -> list[Dict]:
-        now = datetime.now(tz=pytz.timezone(config.DEFAULT_TZ))
-        for row in self.data:
-            row["campaign_id"] = row["id"]
-            row["id"] = uuid4()
-            row["created"] = now
-            row["updated"] = now
-        return self.data
+    row_id_columns = ("creative_id",)
+    spec = mapping.EntitySpec(
+        [
+            mapping.FieldSpec("creative_id", "id"),
+            mapping.FieldSpec("name"),
+            mapping.FieldSpec("preview_url"),
+            mapping.FieldSpec("full_html_preview_url"),
+            mapping.FieldSpec("width"),
+            mapping.FieldSpec("height"),
+            mapping.FieldSpec("video_duration"),
+            mapping.FieldSpec("video_url"),
+        ],
+        passthrough=True
+    )
+    
+
+class GetCampaignsEnricher(DimensionEnricherFactory):
+
+    row_id_columns = ("campaign_id",)
+    spec = mapping.EntitySpec(
+        [mapping.FieldSpec("campaign_id", "id")],
+        passthrough=True
+    )
 
 
 def main() -> None:
@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+from typing import Optional, Any, Callable, Iterable, Sequence
+from operator import methodcaller
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    target: str
+    source: Optional[str] = None # dotted path in the API object, defaults to target
+    default: Any = None
+    type: Optional[Callable[[Any], Any]] = None
+
+    @property
+    def path(self) -> tuple[str]:
+        return tuple((self.target if self.source is None else self.source).split("."))
+
+
+class EntitySpec:
+    """
+    Declarative mapping of API objects to staging columns. Every field is
+    turned once into a getter, an operator.methodcaller or a small closure
+    for dotted paths and types, and the payload is walked in one pass that
+    appends straight into the output columns without touching the payload
+    itself. With passthrough=True the top-level keys that no field reads
+    are copied in the same pass.
+    """
+
+    def __init__(
+            self,
+            fields: Sequence[FieldSpec],
+            passthrough: Optional[bool] = False
+    ) -> None:
+        self.fields = tuple(fields)
+        self.passthrough = passthrough
+        self.consumed = frozenset(field.path[0] for field in self.fields) | frozenset(self.targets)
+        self.getters = tuple(self.create_getter(field) for field in self.fields)
+
+    @property
+    def targets(self) -> tuple[str]:
+        return tuple(field.target for field in self.fields)
+
+    def create_getter(self, field: FieldSpec) -> Callable[[dict], Any]:
+        key, *nested_keys = field.path
+        default = field.default
+        if nested_keys:
+            def get(row: dict) -> Any:
+                value = row.get(key)
+                for nested_key in nested_keys:
+                    value = value.get(nested_key) if isinstance(value, dict) else None
+                return default if value is None else value
+        else:
+            get = methodcaller("get", key, default)
+        if field.type is None:
+            return get
+        cast = field.type
+
+        def get_typed(row: dict) -> Any:
+            value = get(row)
+            return None if value is None else cast(value)
+        return get_typed
+
+    def apply(self, rows: Iterable[dict]) -> dict[str, list]:
+        columns = [[] for _ in self.fields]
+        steps = tuple(zip([column.append for column in columns], self.getters))
+        extra: dict[str, list] = {}
+        size = 0
+        for row in rows:
+            for append, get in steps:
+                append(get(row))
+            if self.passthrough:
+                for key, value in row.items():
+                    if key not in self.consumed:
+                        column = extra.setdefault(key, [])
+                        if len(column) < size:
+                            column.extend([None] * (size - len(column)))
+                        column.append(value)
+            size += 1
+        for column in extra.values():
+            column.extend([None] * (size - len(column)))
+        return {**dict(zip(self.targets, columns)), **extra}
+
+
+def columns_to_records(columns: dict[str, list]) -> list[dict]:
+    names = tuple(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
@@ -1,13 +1,76 @@
 from abc import ABC, abstractmethod
-from typing import Optional, List, Union
-from requests import Response
-import requests
+from typing import Optional, List, Union, Iterable, Iterator, Any
+from threading import Lock
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import codecs
+import io
 import json
 from datetime import datetime
 
+import pandas
+
+from src import config
+from src.app.caches.liftoff import ResponseCache, get_default_cache
+from src.app.limiters.liftoff import AdaptiveRateLimiter, get_default_limiter
+from src.app.cleaners.liftoff import APIGetReportsIdDataCleaner
+from src.app.metrics.liftoff import PipelineMetrics, get_metrics
+
+
+class RateLimitRetry(Retry):
+    """
+    Retry that leaves 429 to the rate limiter: urllib3 retries every status
+    of RETRY_AFTER_STATUS_CODES that carries Retry-After, even outside
+    status_forcelist, and the limiter would never see those 429s.
+    """
+
+    RETRY_AFTER_STATUS_CODES = frozenset({413, 503})
+
+
+def create_session(
+        pool_connections: Optional[int] = config.LiftoffApi.Http.POOL_CONNECTIONS,
+        pool_maxsize: Optional[int] = config.LiftoffApi.Http.POOL_MAXSIZE,
+        retry_total: Optional[int] = config.LiftoffApi.Http.RETRY_TOTAL,
+        retry_backoff_factor: Optional[float] = config.LiftoffApi.Http.RETRY_BACKOFF_FACTOR,
+        retry_status_forcelist: Optional[tuple[int]] = config.LiftoffApi.Http.RETRY_STATUS_FORCELIST,
+        accept_encoding: Optional[str] = config.LiftoffApi.Http.ACCEPT_ENCODING
+) -> Session:
+    retry = RateLimitRetry(
+        total=retry_total,
+        backoff_factor=retry_backoff_factor,
+        backoff_max=config.LiftoffApi.Http.RETRY_BACKOFF_MAX,
+        status_forcelist=retry_status_forcelist,
+        # POST /reports is not idempotent: a resent request may create a second
+        # report, so only GETs are retried on status and read errors here and
+        # report creation is retried by ELTReport.post_report
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry
+    )
+    session = Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": accept_encoding})
+    return session
+
 
 class APIExtractorFactory(ABC):
 
+    _session: Optional[Session] = None
+    _session_lock = Lock()
+    cacheable: bool = False
+    endpoint: str = None
+    timeout: tuple[float, float] = (
+        config.LiftoffApi.Http.CONNECT_TIMEOUT,
+        config.LiftoffApi.Http.READ_TIMEOUT
+    )
+
     def __init__(
             self,
             api_key: str,
@@ -20,6 +83,15 @@ class APIExtractorFactory(ABC):
         self.api_secret = api_secret
         self.auth = None
         self.response: Union[Response, None] = None
+        self.cache: Optional[ResponseCache] = get_default_cache() if config.ResponseCache.ENABLED else None
+        self.limiter: AdaptiveRateLimiter = get_default_limiter()
+        self.metrics: PipelineMetrics = get_metrics()
+
+    def set_cache(self, cache: Optional[ResponseCache]) -> None:
+        self.cache = cache
+
+    def set_limiter(self, limiter: AdaptiveRateLimiter) -> None:
+        self.limiter = limiter
 
     def set_auth(
             self, 
@@ -30,10 +102,134 @@ class APIExtractorFactory(ABC):
         api_secret = self.api_secret if api_secret is None else api_secret
         self.auth = (api_key, api_secret)
 
+    @classmethod
+    def get_session(cls) -> Session:
+        """
+        One pooled keep-alive session per process, shared by every extractor.
+        """
+        if APIExtractorFactory._session is None:
+            with APIExtractorFactory._session_lock:
+                if APIExtractorFactory._session is None:
+                    APIExtractorFactory._session = create_session()
+        return APIExtractorFactory._session
+
+    @classmethod
+    def close_session(cls) -> None:
+        with APIExtractorFactory._session_lock:
+            if APIExtractorFactory._session is not None:
+                APIExtractorFactory._session.close()
+                APIExtractorFactory._session = None
+
+    def request(self, method: str, url: Optional[str] = None, **kwargs) -> Response:
+        url = self.url if url is None else url
+        kwargs.setdefault("auth", self.auth)
+        kwargs.setdefault("timeout", self.timeout)
+        if not self.use_cache(method, kwargs):
+            return self.send_rate_limited(method, url, **kwargs)
+        key = self.create_cache_key(method, url, kwargs)
+        content = self.cache.get(key)
+        if content is not None:
+            self.metrics.incr("api.cache_hits", account=self.api_key, endpoint=self.endpoint)
+            return self.create_cached_response(url, content)
+        response = self.send_rate_limited(method, url, **kwargs)
+        if response.status_code == 200:
+            self.cache.put(key, response.content)
+        return response
+
+    def send_rate_limited(
+            self,
+            method: str,
+            url: str,
+            max_retries: Optional[int] = config.LiftoffApi.Http.MAX_RATE_LIMIT_RETRIES,
+            **kwargs
+    ) -> Response:
+        """
+        429 responses are retried here rather than by urllib3, so the shared
+        limiter of the account and endpoint can slow down and honour Retry-After.
+        """
+        key = self.limiter.create_key(self.api_key, self.endpoint or url)
+        tags = {"account": self.api_key, "endpoint": self.endpoint}
+        for attempt in range(max_retries + 1):
+            self.limiter.acquire(key)
+            with self.metrics.timer("api.request.seconds", **tags) as timer_tags:
+                response = self.get_session().request(method, url, **kwargs)
+                timer_tags["status"] = response.status_code
+            self.limiter.on_response(key, response)
+            self.record_response(response, kwargs.get("stream", False), tags)
+            if response.status_code != 429 or attempt == max_retries:
+                return response
+            self.metrics.incr("api.rate_limited", **tags)
+            response.close()
+        return response
+
+    def record_response(self, response: Response, stream: bool, tags: dict[str, str]) -> None:
+        retries = getattr(response.raw, "retries", None)
+        if retries is not None:
+            self.metrics.incr("api.request.retries", len(retries.history), **tags)
+        if not stream:
+            self.metrics.incr("api.response.bytes", len(response.content), **tags)
+
+    def use_cache(self, method: str, kwargs: dict) -> bool:
+        return self.cache is not None and self.cacheable and method.upper() == "GET" and not kwargs.get("stream")
+
+    def create_cache_key(self, method: str, url: str, kwargs: dict) -> str:
+        return self.cache.create_key(self.api_key, method, url, kwargs.get("params"))
+
+    def create_cached_response(self, url: str, content: bytes) -> Response:
+        response = Response()
+        response.status_code = 200
+        response.url = url
+        response.encoding = "utf-8"
+        response.headers["Content-Type"] = "application/json"
+        response._content = content
+        return response
+
     @abstractmethod
     def get_response(self):
         pass
 
+    def iter_response_chunks(
+            self,
+            chunk_size: Optional[int] = config.LiftoffApi.GetReportsIdData.STREAM_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """
+        Streams the body of a GET on self.url, from the cache if it is there.
+        """
+        if self.cache is not None and self.cacheable:
+            key = self.create_cache_key("GET", self.url, {})
+            chunks = self.cache.iter_chunks(key, chunk_size)
+            if chunks is not None:
+                self.metrics.incr("api.cache_hits", account=self.api_key, endpoint=self.endpoint)
+                yield from chunks
+                return
+        self.response = self.request("GET", stream=True)
+        with self.response:
+            self.response.raise_for_status()
+            chunks = self.response.iter_content(chunk_size=chunk_size)
+            if self.cache is not None and self.cacheable:
+                chunks = self.cache.tee_chunks(key, chunks)
+            size = 0
+            try:
+                for chunk in chunks:
+                    size += len(chunk)
+                    yield chunk
+            finally:
+                self.metrics.incr("api.response.bytes", size, account=self.api_key, endpoint=self.endpoint)
+
+    def iter_batches(
+            self,
+            batch_size: Optional[int] = config.Orchestration.BATCH_SIZE,
+            chunk_size: Optional[int] = config.LiftoffApi.GetReportsIdData.STREAM_CHUNK_SIZE
+    ) -> Iterator[list[dict]]:
+        """
+        Streams a top-level JSON array response in lists of at most batch_size objects.
+        """
+        self.set_auth()
+        chunks = self.iter_response_chunks(chunk_size)
+        yield from JSONArrayStreamParser(chunks, batch_size).iter_batches()
+        for _ in chunks:
+            pass
+
     def save_response_to_local_json(
             self,
             path: Optional[str] = None,
@@ -56,6 +252,9 @@ class APIGetAppsExtractor(APIExtractorFactory):
     https://docs.liftoff.io/advertiser/reporting_api#get-apps
     """
 
+    endpoint = "apps"
+    cacheable = True
+
     def __init__(
             self,
             api_key: str,
@@ -67,7 +266,7 @@ class APIGetAppsExtractor(APIExtractorFactory):
     def get_response(self) -> Response:
         if self.auth is None:
             self.set_auth()
-        self.response = requests.get(url=self.url, auth=self.auth)
+        self.response = self.request("GET")
         return self.response
     
     def create_local_storage_path_for_response(self) -> str:
@@ -81,6 +280,10 @@ class APIPostReportsExtractor(APIExtractorFactory):
     https://docs.liftoff.io/advertiser/reporting_api#post-reports
     """
 
+    endpoint = "reports"
+    default_group_by = ("apps", "campaigns", "creatives", "country")
+    default_format = "json"
+
     def __init__(
             self,
             api_key: str,
@@ -95,15 +298,16 @@ class APIPostReportsExtractor(APIExtractorFactory):
     def get_response(
             self,
             start_time: str,
-            end_time: str
+            end_time: str,
+            group_by: Optional[List[str]] = None,
+            format: Optional[str] = None
     ) -> Response:
         self.set_auth()
-        self.set_json(start_time, end_time)
+        self.set_json(start_time, end_time, group_by, format)
         self.set_headers()
-        self.response = requests.post(
-            url=self.urßl,
+        self.response = self.request(
+            "POST",
             json=self.json_body,
-            auth=self.auth,
             headers=self.headers
         )
         return self.response
@@ -113,9 +317,10 @@ class APIPostReportsExtractor(APIExtractorFactory):
             start_time: str, # example: "2020-10-01"
             end_time: str, # example: "2020-11-01"
             group_by: Optional[List[str]] = None,
-            format: Optional[str] = "json"
+            format: Optional[str] = None
     ) -> None:
-        group_by = ["apps", "campaigns", "creatives", "country"] if group_by is None else group_by
+        group_by = list(self.default_group_by) if group_by is None else group_by
+        format = self.default_format if format is None else format
         self.json_body = {
             "group_by": group_by,
             "start_time": start_time,
@@ -140,13 +345,15 @@ class APIGetReportsIdStatusExtractor(APIExtractorFactory):
     https://docs.liftoff.io/advertiser/reporting_api#get-reportsidstatus
     """
 
+    endpoint = "reports/status"
+
     def set_url(self, id: str) -> None:
         self.url = f"https://data.liftoff.io/api/v1/reports/{id}/status"
 
     def get_response(self, id: str):
         self.set_auth()
         self.set_url(id)
-        self.response = requests.get(url=self.url, auth=self.auth)
+        self.response = self.request("GET")
         return self.response
 
 
@@ -155,6 +362,9 @@ class APIGetReportsIdDataExtractor(APIExtractorFactory):
     Docs:  
     https://docs.liftoff.io/advertiser/reporting_api#get-reportsiddata
     """
+
+    endpoint = "reports/data"
+    cacheable = True
     
     def set_url(self, id: str) -> None:
         self.url = f"https://data.liftoff.io/api/v1/reports/{id}/data"
@@ -162,9 +372,221 @@ class APIGetReportsIdDataExtractor(APIExtractorFactory):
     def get_response(self, id: str):
         self.set_auth()
         self.set_url(id)
-        self.response = requests.get(url=self.url, auth=self.auth)
+        self.response = self.request("GET")
         return self.response
 
+    def iter_row_batches(
+            self,
+            id: str,
+            batch_size: Optional[int] = config.LiftoffApi.GetReportsIdData.BATCH_SIZE,
+            chunk_size: Optional[int] = config.LiftoffApi.GetReportsIdData.STREAM_CHUNK_SIZE
+    ) -> Iterator[dict[str, list]]:
+        """
+        Streams the report body and yields {"columns": [...], "rows": [...]}
+        batches of at most batch_size rows, without loading the whole body.
+        """
+        chunks = self.iter_chunks(id, chunk_size)
+        yield from ReportDataStreamParser(chunks, batch_size).iter_batches()
+        # the parser stops at the closing brace, drain the tail to finish the cache entry
+        for _ in chunks:
+            pass
+
+    def iter_csv_batches(
+            self,
+            id: str,
+            batch_size: Optional[int] = config.LiftoffApi.GetReportsIdData.BATCH_SIZE,
+            chunk_size: Optional[int] = config.LiftoffApi.GetReportsIdData.STREAM_CHUNK_SIZE
+    ) -> Iterator[pandas.DataFrame]:
+        """
+        Streams a report posted with format="csv" and yields typed DataFrames
+        of at most batch_size rows, parsed by the pandas C engine.
+        """
+        chunks = self.iter_chunks(id, chunk_size)
+        cleaner = APIGetReportsIdDataCleaner(self.api_key)
+        with cleaner.read_csv_response(ChunkStream(chunks), batch_size) as reader:
+            yield from reader
+        for _ in chunks:
+            pass
+
+    def iter_chunks(
+            self,
+            id: str,
+            chunk_size: Optional[int] = config.LiftoffApi.GetReportsIdData.STREAM_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        self.set_auth()
+        self.set_url(id)
+        return self.iter_response_chunks(chunk_size)
+
+
+class ChunkStream(io.RawIOBase):
+    """
+    Read-only file object over an iterator of byte chunks.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        super().__init__()
+        self.chunks = iter(chunks)
+        self.chunk = memoryview(b"")
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while self.position >= len(self.chunk):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.chunk = memoryview(chunk)
+            self.position = 0
+        size = min(len(buffer), len(self.chunk) - self.position)
+        buffer[:size] = self.chunk[self.position:self.position + size]
+        self.position += size
+        return size
+
+
+class JSONStreamParserFactory(ABC):
+    """
+    Base of the incremental JSON parsers: values are decoded one by one with
+    the C json scanner, only the current batch and an undecoded tail are kept.
+    """
+
+    def __init__(
+            self,
+            chunks: Iterable[bytes],
+            batch_size: int
+    ) -> None:
+        self.chunks = iter(chunks)
+        self.batch_size = batch_size
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    @abstractmethod
+    def iter_batches(self) -> Iterator:
+        pass
+
+    def read_more(self) -> bool:
+        if self.eof:
+            return False
+        self.buffer = self.buffer[self.position:]
+        self.position = 0
+        for chunk in self.chunks:
+            if chunk:
+                self.buffer += self.text_decoder.decode(chunk)
+                return True
+        self.buffer += self.text_decoder.decode(b"", final=True)
+        self.eof = True
+        return False
+
+    def skip_whitespace(self) -> None:
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in " \t\r\n":
+                self.position += 1
+            if self.position < len(self.buffer) or not self.read_more():
+                return
+
+    def consume(self, token: str) -> bool:
+        self.skip_whitespace()
+        if self.buffer.startswith(token, self.position):
+            self.position += len(token)
+            return True
+        return False
+
+    def expect(self, token: str) -> None:
+        if not self.consume(token):
+            raise ValueError(f"Expected {token!r} at position {self.position} of the response stream")
+
+    def decode_value(self) -> Any:
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self.read_more():
+                    raise
+                continue
+            # a number at the very end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self.read_more():
+                continue
+            self.position = end
+            return value
+
+
+class JSONArrayStreamParser(JSONStreamParserFactory):
+    """
+    Incremental parser for a top-level JSON array, e.g. GET /apps.
+    """
+
+    def iter_batches(self) -> Iterator[list]:
+        self.expect("[")
+        batch = []
+        while not self.consume("]"):
+            batch.append(self.decode_value())
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+            self.consume(",")
+        if batch:
+            yield batch
+
+
+class ReportDataStreamParser(JSONStreamParserFactory):
+    """
+    Incremental parser for the {"columns": [...], "rows": [[...], ...]}
+    payload of GET /reports/{id}/data. Rows can only be batched once the
+    columns are known; if rows come first, at most max_pending_rows of them
+    are held waiting for the columns and a larger payload is rejected, so
+    memory stays bounded for either key order.
+    """
+
+    rows_key = "rows"
+    columns_key = "columns"
+
+    def __init__(
+            self,
+            chunks: Iterable[bytes],
+            batch_size: Optional[int] = config.LiftoffApi.GetReportsIdData.BATCH_SIZE,
+            max_pending_rows: Optional[int] = None
+    ) -> None:
+        super().__init__(chunks, batch_size)
+        self.max_pending_rows = batch_size if max_pending_rows is None else max_pending_rows
+        self.columns: Optional[list[str]] = None
+        self.fields: dict[str, Any] = {}
+
+    def iter_batches(self) -> Iterator[dict[str, list]]:
+        self.expect("{")
+        rows = []
+        while not self.consume("}"):
+            key = self.decode_value()
+            self.expect(":")
+            if key == self.rows_key:
+                self.expect("[")
+                while not self.consume("]"):
+                    rows.append(self.decode_value())
+                    if self.columns is None:
+                        if len(rows) > self.max_pending_rows:
+                            raise ValueError(
+                                f"The report has more than {self.max_pending_rows} rows before "
+                                f"{self.columns_key!r}, it cannot be streamed in bounded memory"
+                            )
+                    elif len(rows) >= self.batch_size:
+                        yield self.create_batch(rows)
+                        rows = []
+                    self.consume(",")
+            else:
+                self.fields[key] = self.decode_value()
+                if key == self.columns_key:
+                    self.columns = self.fields[key]
+            self.consume(",")
+        if rows:
+            yield self.create_batch(rows)
+
+    def create_batch(self, rows: list[list]) -> dict[str, list]:
+        return {self.columns_key: self.columns, self.rows_key: rows}
+
 
 class APIGetCreativesExtractor(APIExtractorFactory):
     """
@@ -172,6 +594,9 @@ class APIGetCreativesExtractor(APIExtractorFactory):
     https://docs.liftoff.io/advertiser/reporting_api#get-creatives
     """
 
+    endpoint = "creatives"
+    cacheable = True
+
     def __init__(
             self,
             api_key: str,
@@ -182,7 +607,7 @@ class APIGetCreativesExtractor(APIExtractorFactory):
 
     def get_response(self) -> Response:
         self.set_auth()
-        self.response = requests.get(url=self.url, auth=self.auth)
+        self.response = self.request("GET")
         return self.response
     
 
@@ -192,6 +617,9 @@ class APIGetCampaignsExtractor(APIExtractorFactory):
     https://docs.liftoff.io/advertiser/reporting_api#get-campaigns
     """
 
+    endpoint = "campaigns"
+    cacheable = True
+
     def __init__(
             self,
             api_key: str,
@@ -202,7 +630,7 @@ class APIGetCampaignsExtractor(APIExtractorFactory):
 
     def get_response(self) -> Response:
         self.set_auth()
-        self.response = requests.get(url=self.url, auth=self.auth)
+        self.response = self.request("GET")
         return self.response
 
 
@@ -1,11 +1,14 @@
 from abc import ABC
 from typing import Optional, Tuple, Any, Generator, Dict
+from threading import Lock
+from time import monotonic
 import os
 
 from clickhouse_connect.driver.client import Client
 from dotenv import load_dotenv
 
-from src.db.clickhouse.client_init import create_client
+from src import config
+from src.db.clickhouse.client_init import get_client
 from src.db.clickhouse import models
 
 load_dotenv()
@@ -33,7 +36,7 @@ class SecretExtractorFactory(ABC):
 class LiftoffSecretExtractor(SecretExtractorFactory):
 
     def __init__(self, ch_client: Optional[Client] = None):
-        self.ch_client = create_client() if ch_client is None else ch_client
+        self.ch_client = get_client() if ch_client is None else ch_client
 
     def get_tuple_of_api_keys(self) -> tuple[str]:
         query = f"""
@@ -47,9 +50,9 @@ class LiftoffSecretExtractor(SecretExtractorFactory):
         query = f"""
             SELECT api_secret
             FROM {models.LiftoffSecretAccountModel.FULL_NAME}
-            WHERE api_key = '{api_key}'
+            WHERE api_key = {{api_key:String}}
         """
-        query_result = self.ch_client.query(query=query)
+        query_result = self.ch_client.query(query=query, parameters={"api_key": api_key})
         return query_result.first_item["api_secret"]
     
     def get_full_secret_data(self) -> tuple[dict[str]]:
@@ -61,6 +64,76 @@ class LiftoffSecretExtractor(SecretExtractorFactory):
         return self.from_named_results_to_tuple_of_dicts(query_result.named_results())
 
 
+
+class LiftoffSecretProvider:
+    """
+    All (api_key, api_secret) pairs loaded with one query and kept for
+    ttl seconds, so resolving the secrets of a run costs one round trip.
+    A key missing from the cache is looked up on its own, e.g. an account
+    added after the last refresh.
+    """
+
+    def __init__(
+            self,
+            extractor: Optional[LiftoffSecretExtractor] = None,
+            ttl: Optional[float] = config.SecretCache.TTL_SECONDS
+    ) -> None:
+        self.extractor = extractor
+        self.ttl = ttl
+        self.secrets: dict[str, str] = {}
+        self.loaded_at: Optional[float] = None
+        self.lock = Lock()
+
+    def get_extractor(self) -> LiftoffSecretExtractor:
+        if self.extractor is None:
+            self.extractor = LiftoffSecretExtractor()
+        return self.extractor
+
+    def is_fresh(self) -> bool:
+        return self.loaded_at is not None and monotonic() - self.loaded_at < self.ttl
+
+    def get_secrets(self) -> dict[str, str]:
+        with self.lock:
+            if not self.is_fresh():
+                accounts = self.get_extractor().get_full_secret_data()
+                self.secrets = {account["api_key"]: account["api_secret"] for account in accounts}
+                self.loaded_at = monotonic()
+            return self.secrets
+
+    def get_accounts(self) -> tuple[dict[str]]:
+        return tuple(
+            {"api_key": api_key, "api_secret": api_secret}
+            for api_key, api_secret in self.get_secrets().items()
+        )
+
+    def get_api_secret(self, api_key: str) -> str:
+        api_secret = self.get_secrets().get(api_key)
+        if api_secret is None:
+            api_secret = self.get_extractor().get_api_secret_by_api_key(api_key)
+            with self.lock:
+                self.secrets[api_key] = api_secret
+        return api_secret
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.loaded_at = None
+
+
+default_provider: Optional[LiftoffSecretProvider] = None
+default_provider_lock = Lock()
+
+
+def get_default_secret_provider() -> LiftoffSecretProvider:
+    """
+    Provider shared by everything in the worker process.
+    """
+    global default_provider
+    with default_provider_lock:
+        if default_provider is None:
+            default_provider = LiftoffSecretProvider()
+        return default_provider
+
+
 def main() -> None:
     extractor = LiftoffSecretExtractor()
     res = extractor.get_full_secret_data()
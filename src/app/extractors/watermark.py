@@ -0,0 +1,73 @@
+from typing import Optional
+from datetime import date, datetime, timedelta
+
+from clickhouse_connect.driver.client import Client
+
+from src import config
+from src.db.clickhouse.client_init import get_client
+from src.db.clickhouse import models
+
+
+class LiftoffReportWatermarkExtractor:
+
+    def __init__(self, ch_client: Optional[Client] = None):
+        self.ch_client = get_client() if ch_client is None else ch_client
+
+    def get_watermarks(
+            self,
+            table_name: Optional[str] = models.LiftoffStagingReportModel.TABLE_NAME,
+            staging_layout: Optional[str] = config.ClickHouseInsert.STAGING_LAYOUT
+    ) -> dict[str, date]:
+        """
+        Latest loaded report date of every account, read with one aggregate
+        over all st_liftoff_* databases, or over the consolidated report
+        table grouped by api_key.
+        """
+        if staging_layout == "consolidated":
+            return self.get_consolidated_watermarks()
+        query = f"""
+            SELECT _database AS db_name, max(date) AS watermark
+            FROM merge(REGEXP('^{models.ST_LIFTOFF_DB_PREFIX}'), '^{table_name}$')
+            GROUP BY db_name
+        """
+        query_result = self.ch_client.query(query=query)
+        prefix_length = len(models.ST_LIFTOFF_DB_PREFIX)
+        return {
+            db_name[prefix_length:]: watermark
+            for db_name, watermark in query_result.result_rows
+        }
+
+    def get_consolidated_watermarks(
+            self,
+            model: Optional[type[models.LiftoffConsolidatedModelFactory]] = models.LiftoffConsolidatedReportModel
+    ) -> dict[str, date]:
+        """
+        The table is created first, so the first run of the consolidated
+        layout reads an empty table instead of failing on a missing one.
+        """
+        self.ch_client.command(model.create_database_query())
+        self.ch_client.command(model.create_table_query())
+        query = f"""
+            SELECT api_key, max(date) AS watermark
+            FROM `{model.DB_NAME}`.`{model.TABLE_NAME}`
+            GROUP BY api_key
+        """
+        query_result = self.ch_client.query(query=query)
+        return dict(query_result.result_rows)
+
+    @staticmethod
+    def get_start_time(
+            watermark: Optional[date],
+            lookback_days: Optional[int] = config.LiftoffApi.PostReports.RESTATEMENT_LOOKBACK_DAYS,
+            default_start_time: Optional[str] = config.LiftoffApi.PostReports.DEFAULT_START_TIME,
+            date_format: Optional[str] = config.LiftoffApi.PostReports.DATE_REQUEST_FORMAT
+    ) -> str:
+        """
+        The day after the watermark, moved back by lookback_days to request
+        the last loaded days again.
+        """
+        default_start = datetime.strptime(default_start_time, date_format).date()
+        if watermark is None:
+            return default_start_time
+        start = max(default_start, watermark + timedelta(days=1 - lookback_days))
+        return start.strftime(date_format)
@@ -0,0 +1,267 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Any, Callable
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from time import time, sleep
+
+from requests import Response
+
+from src import config
+
+
+class TokenBucketBackendFactory(ABC):
+
+    @abstractmethod
+    def take(self, key: str, capacity: float, default_rate: float) -> float:
+        """
+        Takes one token from the bucket. Returns 0 if it was taken, otherwise
+        the number of seconds to wait before trying again.
+        """
+        pass
+
+    @abstractmethod
+    def scale_rate(
+            self,
+            key: str,
+            factor: float,
+            step: float,
+            min_rate: float,
+            max_rate: float,
+            default_rate: float
+    ) -> float:
+        pass
+
+    @abstractmethod
+    def block(self, key: str, seconds: float, default_rate: float) -> None:
+        pass
+
+
+class InProcessTokenBucketBackend(TokenBucketBackendFactory):
+
+    def __init__(self, clock: Optional[Callable[[], float]] = time) -> None:
+        self.lock = Lock()
+        self.clock = clock
+        self.buckets: dict[str, dict[str, float]] = {}
+
+    def get_bucket(self, key: str, capacity: float, default_rate: float) -> dict[str, float]:
+        if key not in self.buckets:
+            self.buckets[key] = {
+                "tokens": capacity,
+                "updated": self.clock(),
+                "blocked_until": 0.0,
+                "rate": default_rate
+            }
+        return self.buckets[key]
+
+    def take(self, key: str, capacity: float, default_rate: float) -> float:
+        with self.lock:
+            bucket = self.get_bucket(key, capacity, default_rate)
+            now = self.clock()
+            if now < bucket["blocked_until"]:
+                return bucket["blocked_until"] - now
+            bucket["tokens"] = min(capacity, bucket["tokens"] + (now - bucket["updated"]) * bucket["rate"])
+            bucket["updated"] = now
+            if bucket["tokens"] >= 1:
+                bucket["tokens"] -= 1
+                return 0.0
+            return (1 - bucket["tokens"]) / bucket["rate"]
+
+    def scale_rate(
+            self,
+            key: str,
+            factor: float,
+            step: float,
+            min_rate: float,
+            max_rate: float,
+            default_rate: float
+    ) -> float:
+        with self.lock:
+            bucket = self.get_bucket(key, 1.0, default_rate)
+            bucket["rate"] = min(max_rate, max(min_rate, bucket["rate"] * factor + step))
+            return bucket["rate"]
+
+    def block(self, key: str, seconds: float, default_rate: float) -> None:
+        with self.lock:
+            bucket = self.get_bucket(key, 1.0, default_rate)
+            now = self.clock()
+            bucket["blocked_until"] = max(bucket["blocked_until"], now + seconds)
+            # the bucket refills from the end of the block, not in it
+            bucket["tokens"] = 0.0
+            bucket["updated"] = bucket["blocked_until"]
+
+
+class RedisTokenBucketBackend(TokenBucketBackendFactory):
+    """
+    Shares the buckets between all workers through Redis. Every operation is
+    a single Lua script using the Redis clock, so workers never race or
+    depend on their own clocks.
+    """
+
+    take_script = """
+        local now_parts = redis.call('TIME')
+        local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+        local capacity = tonumber(ARGV[1])
+        local data = redis.call('HMGET', KEYS[1], 'tokens', 'updated', 'blocked_until', 'rate')
+        local tokens = tonumber(data[1]) or capacity
+        local updated = tonumber(data[2]) or now
+        local blocked_until = tonumber(data[3]) or 0
+        local rate = tonumber(data[4]) or tonumber(ARGV[2])
+        if now < blocked_until then
+            return tostring(blocked_until - now)
+        end
+        tokens = math.min(capacity, tokens + (now - updated) * rate)
+        local wait = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+        else
+            wait = (1 - tokens) / rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now), 'rate', tostring(rate))
+        redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+        return tostring(wait)
+    """
+
+    scale_rate_script = """
+        local rate = tonumber(redis.call('HGET', KEYS[1], 'rate')) or tonumber(ARGV[6])
+        rate = math.min(tonumber(ARGV[5]), math.max(tonumber(ARGV[4]), rate * tonumber(ARGV[1]) + tonumber(ARGV[2])))
+        redis.call('HSET', KEYS[1], 'rate', tostring(rate))
+        redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+        return tostring(rate)
+    """
+
+    block_script = """
+        local now_parts = redis.call('TIME')
+        local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+        local blocked_until = math.max(tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0, now + tonumber(ARGV[1]))
+        redis.call('HSET', KEYS[1], 'blocked_until', tostring(blocked_until), 'tokens', '0', 'updated', tostring(blocked_until))
+        redis.call('HSETNX', KEYS[1], 'rate', ARGV[3])
+        redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+        return tostring(blocked_until)
+    """
+
+    def __init__(
+            self,
+            client: Optional[Any] = None,
+            url: Optional[str] = config.RateLimit.REDIS_URL,
+            key_prefix: Optional[str] = config.RateLimit.REDIS_KEY_PREFIX,
+            ttl_seconds: Optional[int] = 60 * 60
+    ) -> None:
+        if client is None:
+            try:
+                import redis
+            except ImportError as error:
+                raise ImportError("The redis rate limit backend requires the redis package") from error
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.key_prefix = key_prefix
+        self.ttl_seconds = ttl_seconds
+        self.take_func = client.register_script(self.take_script)
+        self.scale_rate_func = client.register_script(self.scale_rate_script)
+        self.block_func = client.register_script(self.block_script)
+
+    def create_key(self, key: str) -> str:
+        return f"{self.key_prefix}{key}"
+
+    def take(self, key: str, capacity: float, default_rate: float) -> float:
+        return float(self.take_func(
+            keys=[self.create_key(key)],
+            args=[capacity, default_rate, self.ttl_seconds]
+        ))
+
+    def scale_rate(
+            self,
+            key: str,
+            factor: float,
+            step: float,
+            min_rate: float,
+            max_rate: float,
+            default_rate: float
+    ) -> float:
+        return float(self.scale_rate_func(
+            keys=[self.create_key(key)],
+            args=[factor, step, self.ttl_seconds, min_rate, max_rate, default_rate]
+        ))
+
+    def block(self, key: str, seconds: float, default_rate: float) -> None:
+        self.block_func(keys=[self.create_key(key)], args=[seconds, self.ttl_seconds, default_rate])
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket per (api_key, endpoint). A 429 cuts the rate by
+    decrease_factor and blocks the bucket for Retry-After seconds, every
+    successful call raises it again by increase_step up to max_rate.
+    """
+
+    def __init__(
+            self,
+            backend: Optional[TokenBucketBackendFactory] = None,
+            rate: Optional[float] = config.RateLimit.RATE,
+            capacity: Optional[float] = config.RateLimit.CAPACITY,
+            min_rate: Optional[float] = config.RateLimit.MIN_RATE,
+            max_rate: Optional[float] = config.RateLimit.MAX_RATE,
+            decrease_factor: Optional[float] = config.RateLimit.DECREASE_FACTOR,
+            increase_step: Optional[float] = config.RateLimit.INCREASE_STEP,
+            default_retry_after: Optional[float] = config.RateLimit.DEFAULT_RETRY_AFTER,
+            sleep_func: Optional[Callable[[float], None]] = sleep
+    ) -> None:
+        self.backend = InProcessTokenBucketBackend() if backend is None else backend
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.default_retry_after = default_retry_after
+        self.sleep_func = sleep_func
+
+    def create_key(self, api_key: str, endpoint: str) -> str:
+        return f"{api_key}:{endpoint}"
+
+    def acquire(self, key: str) -> float:
+        waited = 0.0
+        while (wait := self.backend.take(key, self.capacity, self.rate)) > 0:
+            self.sleep_func(wait)
+            waited += wait
+        return waited
+
+    def on_response(self, key: str, response: Response) -> None:
+        if response.status_code == 429:
+            self.backend.scale_rate(key, self.decrease_factor, 0.0, self.min_rate, self.max_rate, self.rate)
+            self.backend.block(key, self.get_retry_after(response), self.rate)
+        elif response.status_code < 500:
+            self.backend.scale_rate(key, 1.0, self.increase_step, self.min_rate, self.max_rate, self.rate)
+
+    def get_retry_after(self, response: Response) -> float:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is None:
+            return self.default_retry_after
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time())
+        except (TypeError, ValueError):
+            return self.default_retry_after
+
+
+_default_limiter: Optional[AdaptiveRateLimiter] = None
+_default_limiter_lock = Lock()
+
+
+def create_backend(name: Optional[str] = config.RateLimit.BACKEND) -> TokenBucketBackendFactory:
+    if name == "redis":
+        return RedisTokenBucketBackend()
+    if name == "memory":
+        return InProcessTokenBucketBackend()
+    raise ValueError(f"Unknown rate limit backend: {name}")
+
+
+def get_default_limiter() -> AdaptiveRateLimiter:
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_limiter_lock:
+            if _default_limiter is None:
+                _default_limiter = AdaptiveRateLimiter(create_backend())
+    return _default_limiter
@@ -1,18 +1,53 @@
 from abc import ABC, abstractmethod
-from typing import Optional, List, Dict, Union
+from typing import Optional, List, Dict, Union, Iterable, Iterator, Callable, Any, ContextManager
 import json
 import os
-from datetime import datetime
+from datetime import date, datetime
+from time import sleep
+from threading import Lock
+from uuid import uuid4
 
 from clickhouse_connect.driver.client import Client
+from clickhouse_connect.driver.exceptions import OperationalError
+from clickhouse_connect.datatypes.registry import get_from_name
+from clickhouse_connect.datatypes.base import ClickHouseType
+from clickhouse_connect.driver.summary import QuerySummary
 import pandas
+import pytz
 
+from src import config
+from src.app.metrics.liftoff import get_metrics
 from src.db.clickhouse import models
 from src.db.clickhouse import client_init
 
 
+def run_directly(func: Callable[..., Any], *args) -> Any:
+    return func(*args)
+
+
+_replace_lock_client: Optional[Any] = None
+_replace_lock_client_lock = Lock()
+
+
+def get_replace_lock_client(url: Optional[str] = config.ClickHouseInsert.REPLACE_LOCK_REDIS_URL) -> Any:
+    global _replace_lock_client
+    if _replace_lock_client is None:
+        with _replace_lock_client_lock:
+            if _replace_lock_client is None:
+                try:
+                    import redis
+                except ImportError as error:
+                    raise ImportError("The redis replace lock backend requires the redis package") from error
+                _replace_lock_client = redis.Redis.from_url(url)
+    return _replace_lock_client
+
+
 class LoaderFactory(ABC):
 
+    # serializes partition replaces of one table in this process, see get_replace_lock
+    replace_locks: dict[tuple[str, str], Lock] = {}
+    replace_locks_lock = Lock()
+
     def __init__(
             self,
             data: Optional[Union[List, Dict]] = None,
@@ -20,9 +55,12 @@ class LoaderFactory(ABC):
             model: models.ModelFactory = None,
             ch_client: Optional[Client] = None
     ) -> None:
-        self.data = self.get_json_data_from_local_storage(path_to_data) if data is None else data
+        self.data = self.get_json_data_from_local_storage(path_to_data) if data is None and path_to_data is not None else data
         self.ch_client = self.get_default_ch_client() if ch_client is None else ch_client
         self.model = model
+        self.column_types: dict[tuple, list[ClickHouseType]] = {}
+        self.column_types_lock = Lock()
+        self.metrics = get_metrics()
 
     def get_json_data_from_local_storage(
             self,
@@ -41,32 +79,500 @@ class LoaderFactory(ABC):
                 record[column] = datetime.fromisoformat(record[column])
         return json_data
     
-    def get_default_ch_client(self) -> Client:
-        return client_init.create_client()
+    def get_default_ch_client(self) -> client_init.PooledClient:
+        return client_init.get_client()
     
     def create_st_liftoff_db_name(self, api_key) -> str:
-        return f"st_liftoff_{api_key}"
+        return f"{models.ST_LIFTOFF_DB_PREFIX}{api_key}"
     
     def load_data_to_clickhouse(
             self,
             data: Optional[pandas.DataFrame] = None,
             db_name: Optional[str] = None,
-            table_name: Optional[str] = None
-    ) -> None:
+            table_name: Optional[str] = None,
+            block_size: Optional[int] = config.ClickHouseInsert.BLOCK_SIZE,
+            tags: Optional[dict[str, str]] = None
+    ) -> int:
+        """
+        Inserts the data in blocks of block_size rows, so neither side holds
+        the whole dataset in one insert and a failed block is retried alone.
+        """
         db_name = self.model.DB_NAME if db_name is None else db_name
         table_name = self.model.TABLE_NAME if table_name is None else table_name
         df = pandas.DataFrame(self.data) if data is None else data
-        self.ch_client.insert_df(
-            database=db_name,
+        settings = self.get_insert_settings()
+        for chunk in self.iter_df_chunks(df, block_size):
+            self.insert_with_retry(lambda: self.ch_client.insert_df(
+                database=db_name,
+                table=table_name,
+                df=chunk,
+                settings=settings
+            ), table_name=table_name, tags=tags)
+        print("The data is loaded successfully")
+        return len(df)
+
+    def load_columns_to_clickhouse(
+            self,
+            columns: Dict[str, List],
+            db_name: Optional[str] = None,
+            table_name: Optional[str] = None,
+            block_size: Optional[int] = config.ClickHouseInsert.BLOCK_SIZE,
+            tags: Optional[dict[str, str]] = None
+    ) -> int:
+        """
+        Inserts column-oriented data (e.g. the output of enrich_to_columns)
+        with the native column insert, without building a DataFrame. Column
+        names and types come from the model; models without COLUMNS take
+        the types from the table once per column set.
+        """
+        db_name = self.model.DB_NAME if db_name is None else db_name
+        table_name = self.model.TABLE_NAME if table_name is None else table_name
+        size = len(next(iter(columns.values()), ()))
+        if not size:
+            return 0
+        names = tuple(columns) if self.model.COLUMNS is None else tuple(self.model.COLUMNS)
+        data = [columns[name] if name in columns else [None] * size for name in names]
+        for start in range(0, size, block_size):
+            block = data if size <= block_size else [values[start:start + block_size] for values in data]
+            self.insert_with_retry(
+                lambda: self.insert_columns(block, db_name, table_name, names),
+                table_name=table_name,
+                tags=tags
+            )
+        print("The data is loaded successfully")
+        return size
+
+    def insert_columns(
+            self,
+            block: List[List],
+            db_name: Optional[str],
+            table_name: str,
+            names: tuple[str]
+    ) -> QuerySummary:
+        """
+        Builds a new insert context on every call: the context is stateful,
+        so one context per attempt lets a retry send the block from its
+        first row and keeps concurrent inserts of the loader apart.
+        """
+        context = self.ch_client.create_insert_context(
             table=table_name,
-            df=df
+            database=db_name,
+            column_names=list(names),
+            column_types=self.get_column_types(db_name, table_name, names),
+            column_oriented=True,
+            settings=self.get_insert_settings(),
+            data=block
         )
-        print("The data is loaded successfully")
+        return self.ch_client.insert(context=context)
+
+    def get_column_types(self, db_name: Optional[str], table_name: str, names: tuple[str]) -> list[ClickHouseType]:
+        key = (db_name, table_name, names)
+        with self.column_types_lock:
+            if key not in self.column_types:
+                if self.model.COLUMNS is not None:
+                    self.column_types[key] = [get_from_name(self.model.COLUMNS[name]) for name in names]
+                else:
+                    self.column_types[key] = self.ch_client.create_insert_context(
+                        table=table_name,
+                        database=db_name,
+                        column_names=list(names)
+                    ).column_types
+            return self.column_types[key]
+
+    def iter_df_chunks(self, df: pandas.DataFrame, block_size: int) -> Iterator[pandas.DataFrame]:
+        if len(df) <= block_size:
+            yield df
+            return
+        for start in range(0, len(df), block_size):
+            yield df.iloc[start:start + block_size]
+
+    def get_insert_settings(
+            self,
+            async_insert: Optional[bool] = config.ClickHouseInsert.ASYNC_INSERT,
+            wait_for_async_insert: Optional[bool] = config.ClickHouseInsert.WAIT_FOR_ASYNC_INSERT
+    ) -> dict[str, int]:
+        if not async_insert:
+            return {}
+        return {"async_insert": 1, "wait_for_async_insert": int(wait_for_async_insert)}
+
+    def insert_with_retry(
+            self,
+            insert: Callable[[], Any],
+            max_attempts: Optional[int] = config.ClickHouseInsert.MAX_ATTEMPTS,
+            retry_delay: Optional[float] = config.ClickHouseInsert.RETRY_DELAY,
+            table_name: Optional[str] = None,
+            tags: Optional[dict[str, str]] = None
+    ) -> Any:
+        """
+        Retries connection-level failures only; errors reported by the
+        server (schema, types) are raised straight away. tags (e.g. account
+        and entity) are added to the insert metrics next to the table.
+        """
+        tags = {} if tags is None else tags
+        for attempt in range(1, max_attempts + 1):
+            try:
+                with self.metrics.timer("clickhouse.insert.seconds", table=table_name, **tags):
+                    summary = insert()
+                self.record_insert(summary, table_name, tags)
+                return summary
+            except OperationalError as error:
+                if attempt == max_attempts:
+                    raise
+                self.metrics.incr("clickhouse.insert.retries", table=table_name, **tags)
+                print(f"Insert attempt {attempt} failed, retrying: {error}")
+                sleep(retry_delay * 2 ** (attempt - 1))
+
+    def record_insert(self, summary: Any, table_name: Optional[str], tags: dict[str, str]) -> None:
+        if isinstance(summary, QuerySummary):
+            self.metrics.incr("clickhouse.insert.rows", summary.written_rows, table=table_name, **tags)
+            self.metrics.incr("clickhouse.insert.bytes", summary.written_bytes(), table=table_name, **tags)
+
+    def load_batches_to_clickhouse(
+            self,
+            batches: Iterable[Union[List[Dict], Dict[str, List], pandas.DataFrame]],
+            db_name: Optional[str] = None,
+            table_name: Optional[str] = None,
+            run_load: Optional[Callable[..., Any]] = None,
+            tags: Optional[dict[str, str]] = None
+    ) -> int:
+        """
+        Inserts every batch as soon as it is produced, so only one batch
+        is held in memory. run_load wraps every insert, e.g. to hold a
+        load slot of the orchestrator only while the batch is inserted and
+        not while the next one is produced.
+        """
+        run_load = run_directly if run_load is None else run_load
+        rows = 0
+        for batch in batches:
+            rows += run_load(self.load_batch_to_clickhouse, batch, db_name, table_name, tags)
+        return rows
+
+    def load_batch_to_clickhouse(
+            self,
+            batch: Union[List[Dict], Dict[str, List], pandas.DataFrame],
+            db_name: Optional[str] = None,
+            table_name: Optional[str] = None,
+            tags: Optional[dict[str, str]] = None
+    ) -> int:
+        if isinstance(batch, dict):
+            return self.load_columns_to_clickhouse(batch, db_name, table_name, tags=tags)
+        if isinstance(batch, list):
+            return self.load_columns_to_clickhouse(self.transform_records_to_columns(batch), db_name, table_name, tags=tags)
+        if batch.empty:
+            return 0
+        return self.load_data_to_clickhouse(batch, db_name, table_name, tags=tags)
+
+    def replace_window_in_clickhouse(
+            self,
+            batches: Iterable[Union[List[Dict], Dict[str, List], pandas.DataFrame]],
+            start: date,
+            end: date,
+            db_name: Optional[str] = None,
+            table_name: Optional[str] = None,
+            date_column: Optional[str] = "date",
+            api_key: Optional[str] = None,
+            run_load: Optional[Callable[..., Any]] = None,
+            tags: Optional[dict[str, str]] = None
+    ) -> int:
+        """
+        Idempotent reload of the half-open window [start, end): the batches
+        go into a temporary table with the same structure, the rows of the
+        affected partitions outside the window are copied next to them and
+        every affected partition is swapped in with REPLACE PARTITION. A
+        reload costs the same as a load and readers see either the old or
+        the new partition, never a mix or duplicates. In a table shared by
+        accounts api_key limits the window to the rows of one account.
+        run_load wraps every insert and the swap, see load_batches_to_clickhouse,
+        tags go to the insert metrics, see insert_with_retry.
+        """
+        run_load = run_directly if run_load is None else run_load
+        db_name = self.model.DB_NAME if db_name is None else db_name
+        table_name = self.model.TABLE_NAME if table_name is None else table_name
+        target = self.create_full_table_name(db_name, table_name)
+        tmp_table_name = f"{table_name}_tmp_{uuid4().hex[:12]}"
+        window = {"start": start, "end": end}
+        in_window = f"{date_column} >= %(start)s AND {date_column} < %(end)s"
+        if api_key is not None:
+            window["api_key"] = api_key
+            in_window = f"api_key = %(api_key)s AND {in_window}"
+        tmp = self.create_full_table_name(db_name, tmp_table_name)
+        self.ch_client.command(f"CREATE TABLE {tmp} AS {target}")
+        try:
+            rows = self.load_batches_to_clickhouse(batches, db_name, tmp_table_name, run_load, tags)
+            run_load(self.replace_partitions, db_name, table_name, tmp_table_name, in_window, window)
+        finally:
+            self.ch_client.command(f"DROP TABLE IF EXISTS {tmp}")
+            with self.column_types_lock:
+                self.column_types = {key: types for key, types in self.column_types.items() if key[1] != tmp_table_name}
+        print(f"The window {start} - {end} is replaced in {target}: {rows} rows")
+        return rows
+
+    def replace_partitions(
+            self,
+            db_name: Optional[str],
+            table_name: str,
+            tmp_table_name: str,
+            in_window: str,
+            window: dict[str, Any]
+    ) -> None:
+        """
+        The rows of an affected partition outside the window are copied into
+        the temporary table on the server with INSERT ... SELECT, so windows
+        need not line up with the partitions and nothing goes through the
+        client; then the complete partition is swapped in.
+        """
+        target = self.create_full_table_name(db_name, table_name)
+        tmp = self.create_full_table_name(db_name, tmp_table_name)
+        with self.get_replace_lock(db_name, table_name):
+            partition_ids = self.get_partition_ids(target, in_window, window) | self.get_partition_ids(tmp, "1", {})
+            for partition_id in sorted(partition_ids):
+                parameters = {**window, "partition_id": partition_id}
+                self.ch_client.command(
+                    f"INSERT INTO {tmp} SELECT * FROM {target} "
+                    f"WHERE _partition_id = %(partition_id)s AND NOT ({in_window})",
+                    parameters=parameters
+                )
+                self.ch_client.command(
+                    f"ALTER TABLE {target} REPLACE PARTITION ID %(partition_id)s FROM {tmp}",
+                    parameters=parameters
+                )
+
+    def get_partition_ids(self, full_table_name: str, condition: str, parameters: dict[str, Any]) -> set[str]:
+        query_result = self.ch_client.query(
+            f"SELECT DISTINCT _partition_id FROM {full_table_name} WHERE {condition}",
+            parameters=parameters
+        )
+        return {row[0] for row in query_result.result_rows}
+
+    def create_full_table_name(self, db_name: Optional[str], table_name: str) -> str:
+        return f"`{table_name}`" if db_name is None else f"`{db_name}`.`{table_name}`"
+
+    @classmethod
+    def get_replace_lock(
+            cls,
+            db_name: Optional[str],
+            table_name: str,
+            backend: Optional[str] = config.ClickHouseInsert.REPLACE_LOCK_BACKEND
+    ) -> ContextManager:
+        """
+        Lock of the partition swaps of one table. The memory lock only
+        covers the threads of this process; with several Celery workers the
+        redis lock keeps two swaps of a partition from overwriting each
+        other's copy of the rows outside the window.
+        """
+        if backend == "redis":
+            return get_replace_lock_client().lock(
+                f"{config.ClickHouseInsert.REPLACE_LOCK_KEY_PREFIX}{db_name}.{table_name}",
+                timeout=config.ClickHouseInsert.REPLACE_LOCK_TIMEOUT,
+                blocking_timeout=config.ClickHouseInsert.REPLACE_LOCK_BLOCKING_TIMEOUT
+            )
+        if backend != "memory":
+            raise ValueError(f"Unknown replace lock backend: {backend}")
+        with cls.replace_locks_lock:
+            return cls.replace_locks.setdefault((db_name, table_name), Lock())
+
+    def transform_records_to_columns(self, records: List[Dict]) -> Dict[str, List]:
+        names = dict.fromkeys(key for record in records for key in record)
+        return {name: [record.get(name) for record in records] for name in names}
     
     def remove_file(self, path: str) -> None:
         os.remove(path)
     
 
+class ConsolidatedStagingLoader(LoaderFactory):
+    """
+    Loads the staging rows of all accounts into one table of the
+    consolidated layout. Batches of different accounts are buffered with
+    their api_key and inserted together once buffer_size rows are
+    collected, so many small account batches become a few large inserts.
+    The rows of an account count as loaded only once the insert holding
+    them succeeded, see pop_account.
+    """
+
+    def __init__(
+            self,
+            model: type[models.LiftoffConsolidatedModelFactory],
+            ch_client: Optional[Client] = None,
+            buffer_size: Optional[int] = config.ClickHouseInsert.BLOCK_SIZE
+    ) -> None:
+        super().__init__(model=model, ch_client=ch_client)
+        self.buffer_size = buffer_size
+        self.buffer: Dict[str, List] = self.create_empty_buffer()
+        self.buffered = 0
+        self.pending: Dict[str, int] = {} # api_key -> rows in the buffer
+        self.loaded: Dict[str, int] = {} # api_key -> rows inserted
+        self.errors: Dict[str, Exception] = {} # api_key -> error of a failed insert
+        self.tags: dict[str, str] = {} # insert metric tags shared by the accounts, e.g. entity
+        self.lock = Lock()
+        self.table_created = False
+
+    def create_empty_buffer(self) -> Dict[str, List]:
+        return {name: [] for name in self.model.COLUMNS}
+
+    def create_table(self) -> None:
+        if not self.table_created:
+            self.ch_client.command(self.model.create_database_query())
+            self.ch_client.command(self.model.create_table_query())
+            self.table_created = True
+
+    def add_api_key(
+            self,
+            api_key: str,
+            batch: Union[List[Dict], Dict[str, List], pandas.DataFrame]
+    ) -> Dict[str, List]:
+        if isinstance(batch, pandas.DataFrame):
+            batch = {
+                column: values.astype(object).where(values.notna(), None).tolist()
+                for column, values in batch.items()
+            }
+        elif isinstance(batch, list):
+            batch = self.transform_records_to_columns(batch)
+        size = len(next(iter(batch.values()), ()))
+        return {**batch, "api_key": [api_key] * size}
+
+    def iter_account_batches(
+            self,
+            api_key: str,
+            batches: Iterable[Union[List[Dict], Dict[str, List], pandas.DataFrame]]
+    ) -> Iterator[Dict[str, List]]:
+        for batch in batches:
+            yield self.add_api_key(api_key, batch)
+
+    def add_batch(
+            self,
+            api_key: str,
+            batch: Union[List[Dict], Dict[str, List], pandas.DataFrame],
+            tags: Optional[dict[str, str]] = None
+    ) -> int:
+        """
+        Buffers the batch and returns 0: its rows are counted by pop_account
+        once they are flushed. A flush mixes accounts, so the account tag
+        only goes to the insert metrics when the buffer holds one account.
+        """
+        columns = self.add_api_key(api_key, batch)
+        size = len(columns["api_key"])
+        with self.lock:
+            if tags is not None:
+                self.tags = {key: value for key, value in tags.items() if key != "account"}
+            for name, values in self.buffer.items():
+                values.extend(columns[name] if name in columns else [None] * size)
+            self.buffered += size
+            self.pending[api_key] = self.pending.get(api_key, 0) + size
+            if self.buffered >= self.buffer_size:
+                self.flush_buffer()
+        return 0
+
+    def flush(self) -> int:
+        with self.lock:
+            return self.flush_buffer()
+
+    def flush_buffer(self) -> int:
+        if not self.buffered:
+            return 0
+        buffer, self.buffer, self.buffered = self.buffer, self.create_empty_buffer(), 0
+        pending, self.pending = self.pending, {}
+        tags = self.tags if len(pending) != 1 else {**self.tags, "account": next(iter(pending))}
+        try:
+            self.create_table()
+            rows = self.load_columns_to_clickhouse(buffer, tags=tags)
+        except Exception as error:
+            for api_key in pending:
+                self.errors[api_key] = error
+            raise
+        for api_key, size in pending.items():
+            self.loaded[api_key] = self.loaded.get(api_key, 0) + size
+        return rows
+
+    def pop_account(self, api_key: str) -> int:
+        """
+        Returns and forgets the rows of api_key flushed so far, or raises
+        the error of the insert that lost some of them.
+        """
+        with self.lock:
+            rows = self.loaded.pop(api_key, 0)
+            error = self.errors.pop(api_key, None)
+        if error is not None:
+            raise RuntimeError(f"Buffered rows of {api_key} were not loaded into {self.model.TABLE_NAME}") from error
+        return rows
+
+    def replace_window_in_clickhouse(
+            self,
+            batches: Iterable[Union[List[Dict], Dict[str, List], pandas.DataFrame]],
+            start: date,
+            end: date,
+            db_name: Optional[str] = None,
+            table_name: Optional[str] = None,
+            date_column: Optional[str] = "date",
+            api_key: Optional[str] = None,
+            run_load: Optional[Callable[..., Any]] = None,
+            tags: Optional[dict[str, str]] = None
+    ) -> int:
+        """
+        The partitions are shared by all accounts, so swapping one would
+        copy the rows of every other account. The window of api_key is
+        inserted directly, bypassing the buffer, and then its rows older
+        than this load are deleted: row ids are deterministic, so the
+        ReplacingMergeTree collapses the reloaded rows and the delete only
+        drops rows the API no longer returns.
+        """
+        db_name = self.model.DB_NAME if db_name is None else db_name
+        table_name = self.model.TABLE_NAME if table_name is None else table_name
+        target = self.create_full_table_name(db_name, table_name)
+        loaded_from = datetime.now(tz=pytz.timezone(config.DEFAULT_TZ)).replace(microsecond=0)
+        self.create_table()
+        rows = self.load_batches_to_clickhouse(
+            self.iter_account_batches(api_key, batches),
+            db_name,
+            table_name,
+            run_load,
+            tags
+        )
+        run_load = run_directly if run_load is None else run_load
+        run_load(
+            self.ch_client.command,
+            f"DELETE FROM {target} WHERE api_key = %(api_key)s "
+            f"AND {date_column} >= %(start)s AND {date_column} < %(end)s "
+            f"AND {self.model.VERSION_COLUMN} < %(loaded_from)s",
+            {"api_key": api_key, "start": start, "end": end, "loaded_from": loaded_from}
+        )
+        print(f"The window {start} - {end} of {api_key} is replaced in {target}: {rows} rows")
+        return rows
+
+
+consolidated_loaders: dict[type[models.ModelFactory], ConsolidatedStagingLoader] = {}
+consolidated_loaders_lock = Lock()
+
+
+def get_consolidated_loader(model: type[models.LiftoffConsolidatedModelFactory]) -> ConsolidatedStagingLoader:
+    """
+    Process-wide loader of a consolidated table, shared by all accounts so
+    their batches end up in the same inserts.
+    """
+    with consolidated_loaders_lock:
+        if model not in consolidated_loaders:
+            consolidated_loaders[model] = ConsolidatedStagingLoader(model)
+        return consolidated_loaders[model]
+
+
+def flush_consolidated_loaders(raise_errors: Optional[bool] = True) -> int:
+    """
+    Flushes every loader even if one fails; the failed accounts are
+    reported by pop_account either way.
+    """
+    with consolidated_loaders_lock:
+        loaders = tuple(consolidated_loaders.values())
+    rows = 0
+    errors = []
+    for loader in loaders:
+        try:
+            rows += loader.flush()
+        except Exception as error:
+            errors.append(error)
+    if errors and raise_errors:
+        raise errors[0]
+    return rows
+
+
 class GetReportsIdDataStagingLoader(LoaderFactory):
 
     def __init__(
@@ -0,0 +1,276 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Any, Iterable, Iterator
+from contextlib import contextmanager
+from datetime import timedelta
+from threading import Lock
+from time import perf_counter
+import atexit
+import os
+import re
+import socket
+
+import pandas
+
+from src import config
+
+
+class MetricsBackendFactory(ABC):
+
+    @abstractmethod
+    def incr(self, name: str, value: float, tags: dict[str, str]) -> None:
+        pass
+
+    @abstractmethod
+    def timing(self, name: str, seconds: float, tags: dict[str, str]) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+
+class NullMetricsBackend(MetricsBackendFactory):
+
+    def incr(self, name: str, value: float, tags: dict[str, str]) -> None:
+        pass
+
+    def timing(self, name: str, seconds: float, tags: dict[str, str]) -> None:
+        pass
+
+
+class StatsdMetricsBackend(MetricsBackendFactory):
+    """
+    Sends to Airflow's Stats when running inside Airflow, so the metrics
+    follow its [metrics] settings; otherwise straight to a StatsD server
+    over UDP with DogStatsD tags. Airflow's plain StatsD client drops tags,
+    so unless its Datadog, InfluxDB or OpenTelemetry client is enabled the
+    tags are appended to the metric name, e.g. liftoff.stage.seconds.stage_load.
+    """
+
+    def __init__(
+            self,
+            host: Optional[str] = config.Metrics.STATSD_HOST,
+            port: Optional[int] = config.Metrics.STATSD_PORT,
+            prefix: Optional[str] = config.Metrics.PREFIX
+    ) -> None:
+        self.address = (host, port)
+        self.prefix = prefix
+        self.stats = self.get_airflow_stats()
+        self.stats_tags = self.stats is not None and self.get_airflow_stats_tags()
+        self.socket = None if self.stats is not None else socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def get_airflow_stats(self) -> Any:
+        try:
+            from airflow.stats import Stats
+        except ImportError:
+            return None
+        return Stats
+
+    def get_airflow_stats_tags(self) -> bool:
+        from airflow.configuration import conf
+
+        return any(
+            conf.getboolean("metrics", option, fallback=False)
+            for option in ("statsd_datadog_enabled", "statsd_influxdb_enabled", "otel_on")
+        )
+
+    def create_stat_name(self, name: str, tags: dict[str, str]) -> str:
+        stat_name = f"{self.prefix}.{name}"
+        if self.stats_tags or not tags:
+            return stat_name
+        # Airflow only accepts letters, digits, _ . and - in names, dots split the levels
+        return stat_name + "".join(f".{key}_{re.sub(r'[^a-zA-Z0-9_-]', '_', value)}" for key, value in sorted(tags.items()))
+
+    def clean_tag_value(self, value: str) -> str:
+        # , | # and whitespace delimit the DogStatsD fields
+        return re.sub(r"[,|#\s]", "_", value)
+
+    def incr(self, name: str, value: float, tags: dict[str, str]) -> None:
+        if self.stats is not None:
+            self.stats.incr(self.create_stat_name(name, tags), count=value, tags=tags if self.stats_tags else None)
+        else:
+            self.send(f"{self.prefix}.{name}:{value}|c", tags)
+
+    def timing(self, name: str, seconds: float, tags: dict[str, str]) -> None:
+        if self.stats is not None:
+            self.stats.timing(
+                self.create_stat_name(name, tags),
+                timedelta(seconds=seconds),
+                tags=tags if self.stats_tags else None
+            )
+        else:
+            self.send(f"{self.prefix}.{name}:{seconds * 1000:.3f}|ms", tags)
+
+    def send(self, line: str, tags: dict[str, str]) -> None:
+        if tags:
+            line += "|#" + ",".join(f"{key}:{self.clean_tag_value(value)}" for key, value in tags.items())
+        try:
+            self.socket.sendto(line.encode("utf-8"), self.address)
+        except OSError:
+            pass
+
+
+class PrometheusTextfileBackend(MetricsBackendFactory):
+    """
+    Aggregates counters and latency histograms in memory and writes them in
+    the Prometheus text format for the node_exporter textfile collector.
+    The file is replaced atomically on every flush.
+    """
+
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(
+            self,
+            path: Optional[str] = config.Metrics.PROMETHEUS_TEXTFILE,
+            prefix: Optional[str] = config.Metrics.PREFIX
+    ) -> None:
+        self.path = path
+        self.prefix = prefix
+        self.counters: dict[tuple[str, tuple], float] = {}
+        self.histograms: dict[tuple[str, tuple], list] = {}
+        self.lock = Lock()
+
+    def create_key(self, name: str, tags: dict[str, str]) -> tuple[str, tuple]:
+        return re.sub(r"[^a-zA-Z0-9_]", "_", f"{self.prefix}_{name}"), tuple(sorted(tags.items()))
+
+    def incr(self, name: str, value: float, tags: dict[str, str]) -> None:
+        key = self.create_key(name, tags)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def timing(self, name: str, seconds: float, tags: dict[str, str]) -> None:
+        key = self.create_key(name, tags)
+        with self.lock:
+            histogram = self.histograms.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def format_labels(self, tags: tuple, **extra) -> str:
+        labels = [*tags, *extra.items()]
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{self.escape_label_value(value)}"' for key, value in labels) + "}"
+
+    def escape_label_value(self, value: Any) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    def create_lines(self) -> list[str]:
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, (list(buckets), total, count)) for key, (buckets, total, count) in self.histograms.items())
+        typed = set()
+        for (name, tags), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name}_total counter")
+                typed.add(name)
+            lines.append(f"{name}_total{self.format_labels(tags)} {value}")
+        for (name, tags), (buckets, total, count) in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, bucket_count in zip(self.buckets, buckets):
+                lines.append(f"{name}_bucket{self.format_labels(tags, le=bound)} {bucket_count}")
+            lines.append(f"{name}_bucket{self.format_labels(tags, le='+Inf')} {count}")
+            lines.append(f"{name}_sum{self.format_labels(tags)} {total}")
+            lines.append(f"{name}_count{self.format_labels(tags)} {count}")
+        return lines
+
+    def flush(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write("\n".join(self.create_lines()) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+class PipelineMetrics:
+    """
+    Metrics of the ELT stages: latencies are histograms in seconds, rows,
+    bytes, retries and polls are counters. Tags are plain keyword arguments,
+    typically account, entity and stage.
+    """
+
+    def __init__(self, backend: MetricsBackendFactory) -> None:
+        self.backend = backend
+
+    def incr(self, name: str, value: Optional[float] = 1, **tags) -> None:
+        if value:
+            self.backend.incr(name, value, self.clean_tags(tags))
+
+    def observe(self, name: str, seconds: float, **tags) -> None:
+        self.backend.timing(name, seconds, self.clean_tags(tags))
+
+    def clean_tags(self, tags: dict[str, Any]) -> dict[str, str]:
+        return {key: str(value) for key, value in tags.items() if value is not None}
+
+    @contextmanager
+    def timer(self, name: str, **tags) -> Iterator[dict[str, Any]]:
+        """
+        Observes the duration of the block; the yielded dict can add tags,
+        a failed block is tagged status=error.
+        """
+        extra_tags = {}
+        started = perf_counter()
+        try:
+            yield extra_tags
+        except Exception:
+            extra_tags["status"] = "error"
+            raise
+        finally:
+            self.observe(name, perf_counter() - started, **tags, **extra_tags)
+
+    def iter_stage(self, stage: str, batches: Iterable, **tags) -> Iterator:
+        """
+        Passes the batches through, timing every next() as one step of the
+        stage and counting the rows it produced.
+        """
+        iterator = iter(batches)
+        while True:
+            started = perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            self.observe("stage.seconds", perf_counter() - started, stage=stage, **tags)
+            self.incr("stage.rows_out", count_rows(batch), stage=stage, **tags)
+            yield batch
+
+    def flush(self) -> None:
+        self.backend.flush()
+
+
+def count_rows(batch: Any) -> int:
+    if batch is None:
+        return 0
+    if isinstance(batch, pandas.DataFrame):
+        return len(batch)
+    if isinstance(batch, dict):
+        if "rows" in batch and "columns" in batch:
+            return len(batch["rows"])
+        return len(next(iter(batch.values()), ()))
+    return len(batch)
+
+
+def create_backend(backend: Optional[str] = config.Metrics.BACKEND) -> MetricsBackendFactory:
+    if backend == "statsd":
+        return StatsdMetricsBackend()
+    if backend == "prometheus":
+        return PrometheusTextfileBackend()
+    return NullMetricsBackend()
+
+
+_metrics: Optional[PipelineMetrics] = None
+_metrics_lock = Lock()
+
+
+def get_metrics() -> PipelineMetrics:
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = PipelineMetrics(create_backend())
+                atexit.register(_metrics.flush)
+    return _metrics
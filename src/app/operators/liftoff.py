@@ -0,0 +1,61 @@
+from typing import Any, Optional
+from time import time
+
+from airflow.exceptions import AirflowException
+from airflow.sdk import BaseOperator
+
+from src import config
+from src.app.cleaners import liftoff as cl_lift
+from src.app.triggers import liftoff as tr_lift
+from src.db.sqlite import report_registry
+
+
+class LiftoffReportStatusSensor(BaseOperator):
+    """
+    Deferrable sensor: hands the report ids over to LiftoffReportStatusTrigger
+    and frees the worker slot until every report is completed or failed.
+    """
+
+    template_fields = ("api_key", "report_ids")
+
+    def __init__(
+            self,
+            api_key: str,
+            report_ids: list[str],
+            poll_deadline: Optional[float] = config.LiftoffApi.GetReportsIdStatus.POLL_DEADLINE,
+            **kwargs
+    ) -> None:
+        super().__init__(**kwargs)
+        self.api_key = api_key
+        self.report_ids = report_ids
+        self.poll_deadline = poll_deadline
+
+    def execute(self, context: Any) -> None:
+        self.defer(
+            trigger=tr_lift.LiftoffReportStatusTrigger(
+                api_key=self.api_key,
+                report_ids=self.report_ids,
+                deadline_at=time() + self.poll_deadline
+            ),
+            method_name="execute_complete"
+        )
+
+    def execute_complete(self, context: Any, event: dict[str, Any]) -> dict[str, str]:
+        if event["status"] != "success":
+            self.mark_failed(event["states"])
+            raise AirflowException(
+                f"Liftoff reports of {event['api_key']} finished with status {event['status']}: "
+                f"states={event['states']}, pending={event['pending']}"
+            )
+        return event["states"]
+
+    def mark_failed(self, states: dict[str, str]) -> None:
+        """
+        Marks the reports that did not complete as failed in the registry,
+        so a rerun of the task group posts them again instead of reusing them.
+        """
+        cleaner = cl_lift.APIGetReportsIdStatusCleaner(self.api_key)
+        registry = report_registry.LiftoffReportRegistry()
+        for report_id in self.report_ids:
+            if not cleaner.is_ready_to_download(states.get(report_id)):
+                registry.update_state(report_id, "failed")
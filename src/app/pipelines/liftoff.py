@@ -0,0 +1,112 @@
+from typing import Optional, Any, Callable, Iterable, Sequence
+from threading import Thread, Lock
+import queue
+
+from src import config
+
+
+END = object()
+
+
+class PipelineStage:
+
+    def __init__(
+            self,
+            name: str,
+            func: Callable[[Any], Any],
+            workers: Optional[int] = 1,
+            flat: Optional[bool] = False
+    ) -> None:
+        """
+        func gets one item of the previous stage. A flat stage returns an
+        iterable and every element goes on as a separate item; a plain stage
+        returns one item, None drops it.
+        """
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.flat = flat
+
+
+class StagedPipeline:
+    """
+    Runs every stage in its own worker threads connected by bounded queues.
+    A full queue blocks the stage before it, so a fast stage never runs more
+    than queue_size items ahead of a slow one, while all stages keep busy
+    on different items at the same time. A failed item is handed to
+    on_error (which must not raise) and dropped, the other items go on;
+    without on_error run() raises the first error once the pipeline drained.
+    """
+
+    def __init__(
+            self,
+            stages: Sequence[PipelineStage],
+            queue_size: Optional[int] = config.Orchestration.QUEUE_SIZE,
+            on_error: Optional[Callable[[str, Any, Exception], None]] = None
+    ) -> None:
+        self.stages = tuple(stages)
+        self.queue_size = queue_size
+        self.on_error = on_error
+        self.errors: list[tuple[str, Any, Exception]] = []
+
+    def run(self, items: Iterable) -> None:
+        self.errors = []
+        inboxes = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = [Thread(target=self.feed, args=(items, inboxes[0], self.stages[0].workers), daemon=True)]
+        for index, stage in enumerate(self.stages):
+            is_last = index == len(self.stages) - 1
+            outbox = None if is_last else inboxes[index + 1]
+            next_workers = 0 if is_last else self.stages[index + 1].workers
+            live_workers = [stage.workers]
+            lock = Lock()
+            threads += [
+                Thread(
+                    target=self.work,
+                    args=(stage, inboxes[index], outbox, next_workers, live_workers, lock),
+                    name=f"pipeline-{stage.name}-{worker}",
+                    daemon=True
+                )
+                for worker in range(stage.workers)
+            ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self.errors and self.on_error is None:
+            raise self.errors[0][2]
+
+    def feed(self, items: Iterable, inbox: queue.Queue, workers: int) -> None:
+        try:
+            for item in items:
+                inbox.put(item)
+        finally:
+            for _ in range(workers):
+                inbox.put(END)
+
+    def work(
+            self,
+            stage: PipelineStage,
+            inbox: queue.Queue,
+            outbox: Optional[queue.Queue],
+            next_workers: int,
+            live_workers: list[int],
+            lock: Lock
+    ) -> None:
+        try:
+            while (item := inbox.get()) is not END:
+                try:
+                    result = stage.func(item)
+                    for output in (result if stage.flat else (result,)):
+                        if output is not None and outbox is not None:
+                            outbox.put(output)
+                except Exception as error:
+                    self.errors.append((stage.name, item, error))
+                    if self.on_error is not None:
+                        self.on_error(stage.name, item, error)
+        finally:
+            with lock:
+                live_workers[0] -= 1
+                is_last_worker = not live_workers[0]
+            if is_last_worker and outbox is not None:
+                for _ in range(next_workers):
+                    outbox.put(END)
@@ -0,0 +1,60 @@
+from typing import Optional
+from datetime import datetime, timedelta
+from math import ceil
+
+from src import config
+
+
+class ReportWindowPlanner:
+    """
+    Splits a report period into consecutive windows of window_days days.
+    Windows are half-open like the report period itself: every window ends
+    where the next one starts.
+    """
+
+    def __init__(
+            self,
+            window_days: Optional[int] = config.LiftoffApi.PostReports.WINDOW_DAYS,
+            date_format: Optional[str] = config.LiftoffApi.PostReports.DATE_REQUEST_FORMAT
+    ) -> None:
+        if window_days < 1:
+            raise ValueError(f"window_days must be positive, got {window_days}")
+        self.window_days = window_days
+        self.date_format = date_format
+
+    def split(
+            self,
+            start_time: str, # example: "2020-10-01"
+            end_time: str # example: "2020-11-01"
+    ) -> list[tuple[str, str]]:
+        start = datetime.strptime(start_time, self.date_format).date()
+        end = datetime.strptime(end_time, self.date_format).date()
+        step = timedelta(days=self.window_days)
+        windows = []
+        while start < end:
+            window_end = min(start + step, end)
+            windows.append((start.strftime(self.date_format), window_end.strftime(self.date_format)))
+            start = window_end
+        return windows
+
+
+def group_windows(
+        windows: dict[str, list[tuple[str, str]]],
+        max_groups: int,
+        group_size: Optional[int] = 1
+) -> list[tuple[str, list[tuple[str, str]]]]:
+    """
+    Groups the consecutive windows of every key by group_size, growing
+    group_size until there are at most max_groups groups, e.g. to keep
+    the mapped tasks of a DAG within Airflow's max_map_length.
+    """
+    windows = {key: key_windows for key, key_windows in windows.items() if key_windows}
+    if len(windows) > max_groups:
+        raise ValueError(f"{len(windows)} keys do not fit into {max_groups} groups")
+    while sum(ceil(len(key_windows) / group_size) for key_windows in windows.values()) > max_groups:
+        group_size += 1
+    return [
+        (key, key_windows[start:start + group_size])
+        for key, key_windows in windows.items()
+        for start in range(0, len(key_windows), group_size)
+    ]
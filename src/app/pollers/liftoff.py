@@ -0,0 +1,135 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Iterable, Iterator
+from time import monotonic, sleep
+import random
+
+from src import config
+from src.app.extractors import liftoff as ex_lift
+from src.app.cleaners import liftoff as cl_lift
+from src.app.metrics.liftoff import get_metrics
+
+
+class ReportPollingTimeout(TimeoutError):
+
+    def __init__(self, pending: dict[str, str]) -> None:
+        super().__init__(f"Reports are not ready before the deadline: {sorted(pending)}")
+        self.pending = pending
+
+
+class ExponentialBackoff:
+
+    def __init__(
+            self,
+            initial_delay: Optional[float] = config.LiftoffApi.GetReportsIdStatus.POLL_INITIAL_DELAY,
+            max_delay: Optional[float] = config.LiftoffApi.GetReportsIdStatus.POLL_MAX_DELAY,
+            multiplier: Optional[float] = config.LiftoffApi.GetReportsIdStatus.POLL_MULTIPLIER,
+            jitter: Optional[float] = config.LiftoffApi.GetReportsIdStatus.POLL_JITTER
+    ) -> None:
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def get_delay(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.initial_delay * self.multiplier ** attempt)
+        return delay * (1 - self.jitter * random.random())
+
+
+class ReportStatusPoller:
+    """
+    Tracks the state of many reports of one account at once. Every report
+    has its own backoff schedule, so a slow report doesn't delay the others
+    and a fast one is picked up on its next due check.
+    """
+
+    def __init__(
+            self,
+            api_key: str,
+            api_secret: str,
+            backoff: Optional[ExponentialBackoff] = None,
+            deadline: Optional[float] = config.LiftoffApi.GetReportsIdStatus.POLL_DEADLINE,
+            max_workers: Optional[int] = config.LiftoffApi.GetReportsIdStatus.POLL_MAX_WORKERS
+    ) -> None:
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.backoff = ExponentialBackoff() if backoff is None else backoff
+        self.deadline = deadline
+        self.max_workers = max_workers
+        self.cleaner = cl_lift.APIGetReportsIdStatusCleaner(api_key)
+        self.metrics = get_metrics()
+
+    def get_state(self, id: str) -> str:
+        extractor = ex_lift.APIGetReportsIdStatusExtractor(self.api_key, self.api_secret)
+        response = extractor.get_response(id)
+        response.raise_for_status()
+        state = response.json().get("state")
+        self.metrics.incr("report.polls", account=self.api_key, state=state)
+        return state
+
+    def get_states(self, ids: list[str]) -> dict[str, str]:
+        if len(ids) <= 1:
+            return {id: self.get_state(id) for id in ids}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(ids))) as executor:
+            return dict(zip(ids, executor.map(self.get_state, ids)))
+
+    def iter_finished(self, ids: Iterable[str]) -> Iterator[tuple[str, str]]:
+        """
+        Yields (report_id, state) as soon as each report is completed or failed.
+        Raises ReportPollingTimeout with the still pending reports at the deadline.
+        """
+        schedule = PollSchedule(ids, self.backoff, self.deadline)
+        while schedule.pending:
+            due = schedule.get_due()
+            if due:
+                for id, state in self.get_states(due).items():
+                    if self.cleaner.is_finished(state):
+                        schedule.finish(id)
+                        yield id, state
+                    else:
+                        schedule.reschedule(id, state)
+                continue
+            if schedule.is_expired():
+                self.metrics.incr("report.poll_timeouts", len(schedule.pending), account=self.api_key)
+                raise ReportPollingTimeout(schedule.pending)
+            sleep(schedule.get_sleep_time())
+
+    def wait(self, ids: Iterable[str]) -> dict[str, str]:
+        return dict(self.iter_finished(ids))
+
+
+class PollSchedule:
+
+    def __init__(
+            self,
+            ids: Iterable[str],
+            backoff: ExponentialBackoff,
+            deadline: Optional[float] = None,
+            started: Optional[float] = None
+    ) -> None:
+        now = monotonic()
+        self.backoff = backoff
+        self.deadline_at = None if deadline is None else (now if started is None else started) + deadline
+        self.pending = {id: None for id in ids}
+        self.attempts = {id: 0 for id in self.pending}
+        self.next_check = {id: now for id in self.pending}
+
+    def get_due(self) -> list[str]:
+        now = monotonic()
+        return [id for id in self.pending if self.next_check[id] <= now]
+
+    def reschedule(self, id: str, state: str) -> None:
+        self.pending[id] = state
+        self.next_check[id] = monotonic() + self.backoff.get_delay(self.attempts[id])
+        self.attempts[id] += 1
+
+    def finish(self, id: str) -> None:
+        del self.pending[id]
+
+    def is_expired(self) -> bool:
+        return self.deadline_at is not None and monotonic() >= self.deadline_at
+
+    def get_sleep_time(self) -> float:
+        wake_up = min(self.next_check[id] for id in self.pending)
+        if self.deadline_at is not None:
+            wake_up = min(wake_up, self.deadline_at)
+        return max(0.0, wake_up - monotonic())
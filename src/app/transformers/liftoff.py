@@ -3,6 +3,8 @@ from typing import Any
 import json
 from datetime import datetime
 
+from src.app.enrichers import mapping
+
 
 class APITransformerFactory(ABC):
 
@@ -21,10 +23,14 @@ class APITransformerFactory(ABC):
 
 class APIGetAppsTransformer(APITransformerFactory):
 
-    def transform_to_one_level_of_nesting(self, data: list[dict[Any]] | None = None) -> None:
+    spec = mapping.EntitySpec(
+        [
+            mapping.FieldSpec("optimization_event_id", "optimization_event.id"),
+            mapping.FieldSpec("optimization_event_name", "optimization_event.name"),
+        ],
+        passthrough=True
+    )
+
+    def transform_to_one_level_of_nesting(self, data: list[dict[Any]] | None = None) -> list[dict[Any]]:
         data = self.data if data is None else data
-        for row in self.data:
-            row["optimization_event_id"] = row.get("optimization_event").get("id")
-            row["optimization_event_name"] = row.get("optimization_event").get("name")
-            del row["optimization_event"]
-        return data
\ No newline at end of file
+        return mapping.columns_to_records(self.spec.apply(data))
\ No newline at end of file
@@ -0,0 +1,95 @@
+from typing import Any, AsyncIterator, Optional
+from time import time
+import asyncio
+
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+
+from src import config
+from src.app.extractors import secret as ex_secret
+from src.app.pollers import liftoff as pl_lift
+
+
+class LiftoffReportStatusTrigger(BaseTrigger):
+    """
+    Waits in the triggerer for a set of Liftoff reports to finish, so the
+    waiting task does not hold a worker slot. The API secret is resolved
+    inside the triggerer and never serialized to the metadata database.
+    """
+
+    def __init__(
+            self,
+            api_key: str,
+            report_ids: list[str],
+            deadline_at: Optional[float] = None,
+            initial_delay: Optional[float] = config.LiftoffApi.GetReportsIdStatus.POLL_INITIAL_DELAY,
+            max_delay: Optional[float] = config.LiftoffApi.GetReportsIdStatus.POLL_MAX_DELAY,
+            multiplier: Optional[float] = config.LiftoffApi.GetReportsIdStatus.POLL_MULTIPLIER,
+            jitter: Optional[float] = config.LiftoffApi.GetReportsIdStatus.POLL_JITTER
+    ) -> None:
+        super().__init__()
+        self.api_key = api_key
+        self.report_ids = list(report_ids)
+        self.deadline_at = time() + config.LiftoffApi.GetReportsIdStatus.POLL_DEADLINE if deadline_at is None else deadline_at
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def serialize(self) -> tuple[str, dict[str, Any]]:
+        return (
+            "src.app.triggers.liftoff.LiftoffReportStatusTrigger",
+            {
+                "api_key": self.api_key,
+                "report_ids": self.report_ids,
+                "deadline_at": self.deadline_at,
+                "initial_delay": self.initial_delay,
+                "max_delay": self.max_delay,
+                "multiplier": self.multiplier,
+                "jitter": self.jitter,
+            }
+        )
+
+    def get_poller(self) -> pl_lift.ReportStatusPoller:
+        api_secret = ex_secret.get_default_secret_provider().get_api_secret(self.api_key)
+        backoff = pl_lift.ExponentialBackoff(
+            self.initial_delay,
+            self.max_delay,
+            self.multiplier,
+            self.jitter
+        )
+        return pl_lift.ReportStatusPoller(self.api_key, api_secret, backoff)
+
+    async def run(self) -> AsyncIterator[TriggerEvent]:
+        poller = await asyncio.to_thread(self.get_poller)
+        schedule = pl_lift.PollSchedule(
+            self.report_ids,
+            poller.backoff,
+            deadline=max(0.0, self.deadline_at - time())
+        )
+        states = {}
+        while schedule.pending:
+            due = schedule.get_due()
+            if due:
+                for id, state in (await asyncio.to_thread(poller.get_states, due)).items():
+                    if poller.cleaner.is_finished(state):
+                        schedule.finish(id)
+                        states[id] = state
+                    else:
+                        schedule.reschedule(id, state)
+                continue
+            if schedule.is_expired():
+                yield TriggerEvent({
+                    "status": "timeout",
+                    "api_key": self.api_key,
+                    "states": states,
+                    "pending": schedule.pending
+                })
+                return
+            await asyncio.sleep(schedule.get_sleep_time())
+        failed = [id for id, state in states.items() if poller.cleaner.is_failed(state)]
+        yield TriggerEvent({
+            "status": "failed" if failed else "success",
+            "api_key": self.api_key,
+            "states": states,
+            "pending": {}
+        })
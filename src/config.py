@@ -12,12 +12,108 @@ class LiftoffApi:
     API_KEY = os.getenv("LIFTOFF_API_KEY")
     API_SECRET = os.getenv("LIFTOFF_API_SECRET")
 
+    class Http:
+        POOL_CONNECTIONS = 10
+        POOL_MAXSIZE = 32
+        CONNECT_TIMEOUT = 10
+        READ_TIMEOUT = 300
+        ACCEPT_ENCODING = "gzip, deflate, zstd"
+        RETRY_TOTAL = 5
+        RETRY_BACKOFF_FACTOR = 1
+        RETRY_BACKOFF_MAX = 60
+        RETRY_STATUS_FORCELIST = (500, 502, 503, 504)
+        MAX_RATE_LIMIT_RETRIES = 5
+
     class PostReports:
         DATE_REQUEST_FORMAT = "%Y-%m-%d"
         DEFAULT_START_TIME = "2025-06-01"
+        FORMAT = os.getenv("LIFTOFF_REPORT_FORMAT", "json")
+        WINDOW_DAYS = 7
+        WINDOW_MAX_ATTEMPTS = 3
+        REPORT_TTL_HOURS = int(os.getenv("LIFTOFF_REPORT_TTL_HOURS", 24))
+        # days before the watermark requested again, only in the replace load mode
+        RESTATEMENT_LOOKBACK_DAYS = int(os.getenv("LIFTOFF_RESTATEMENT_LOOKBACK_DAYS", 3))
+        POST_MAX_ATTEMPTS = 3
+        # 504 and read timeouts are left out: the report may exist already
+        POST_RETRY_STATUSES = (500, 502, 503)
     
+    class GetReportsIdStatus:
+        POLL_INITIAL_DELAY = 5
+        POLL_MAX_DELAY = 120
+        POLL_MULTIPLIER = 2
+        POLL_JITTER = 0.5
+        POLL_DEADLINE = 3 * 60 * 60
+        POLL_MAX_WORKERS = 8
+
     class GetReportsIdData:
         DATE_RESPONSE_FORMAT = "%Y-%m-%d"
+        STREAM_CHUNK_SIZE = 1024 * 1024
+        BATCH_SIZE = 50_000
+
+
+class RateLimit:
+    BACKEND = os.getenv("LIFTOFF_RATE_LIMIT_BACKEND", "memory")
+    REDIS_URL = os.getenv("LIFTOFF_RATE_LIMIT_REDIS_URL", "redis://redis:6379/1")
+    REDIS_KEY_PREFIX = "liftoff:rate_limit:"
+    RATE = float(os.getenv("LIFTOFF_RATE_LIMIT_RATE", 5))
+    CAPACITY = float(os.getenv("LIFTOFF_RATE_LIMIT_CAPACITY", 10))
+    MIN_RATE = 0.2
+    MAX_RATE = float(os.getenv("LIFTOFF_RATE_LIMIT_MAX_RATE", 20))
+    DECREASE_FACTOR = 0.5
+    INCREASE_STEP = 0.05
+    DEFAULT_RETRY_AFTER = 10
+
+
+class ResponseCache:
+    ENABLED = os.getenv("LIFTOFF_RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+    DIRECTORY = os.getenv("LIFTOFF_RESPONSE_CACHE_DIR", "src/app/data/response_cache")
+    MAX_BYTES = int(os.getenv("LIFTOFF_RESPONSE_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+    MAX_AGE_SECONDS = int(os.getenv("LIFTOFF_RESPONSE_CACHE_MAX_AGE_SECONDS", 24 * 60 * 60))
+    COMPRESSION_LEVEL = 3
+
+
+class SecretCache:
+    TTL_SECONDS = int(os.getenv("LIFTOFF_SECRET_CACHE_TTL_SECONDS", 300))
+
+
+class Backfill:
+    WINDOW_DAYS = int(os.getenv("LIFTOFF_BACKFILL_WINDOW_DAYS", 7))
+    MAX_PARALLEL_UNITS = int(os.getenv("LIFTOFF_BACKFILL_MAX_PARALLEL_UNITS", 4))
+    MAX_ATTEMPTS = int(os.getenv("LIFTOFF_BACKFILL_MAX_ATTEMPTS", 3))
+    CACHE_DIRECTORY = os.getenv("LIFTOFF_BACKFILL_CACHE_DIR", "src/app/data/backfill_cache")
+    EXPIRED_REPORT_STATUSES = (404, 410)
+
+
+class Metrics:
+    BACKEND = os.getenv("LIFTOFF_METRICS_BACKEND", "statsd") # statsd, prometheus or none
+    PREFIX = "liftoff"
+    STATSD_HOST = os.getenv("LIFTOFF_STATSD_HOST", "localhost")
+    STATSD_PORT = int(os.getenv("LIFTOFF_STATSD_PORT", 8125))
+    PROMETHEUS_TEXTFILE = os.getenv("LIFTOFF_PROMETHEUS_TEXTFILE", "src/app/data/metrics/liftoff.prom")
+
+
+class Orchestration:
+    MAX_WORKERS = int(os.getenv("ELT_MAX_WORKERS", 8))
+    BATCH_SIZE = int(os.getenv("ELT_BATCH_SIZE", 10_000))
+    STAGE_LIMITS = {
+        "extract": int(os.getenv("ELT_EXTRACT_LIMIT", 8)),
+        "enrich": int(os.getenv("ELT_ENRICH_LIMIT", 4)),
+        "load": int(os.getenv("ELT_LOAD_LIMIT", 2)),
+    }
+    QUEUE_SIZE = int(os.getenv("ELT_QUEUE_SIZE", 4)) # batches waiting between two stages
+
+
+class Airflow:
+    SCHEDULE = os.getenv("LIFTOFF_DAG_SCHEDULE", "@daily")
+    # pools must exist: airflow pools set liftoff_api 8 "Liftoff API calls"
+    LIFTOFF_API_POOL = os.getenv("LIFTOFF_API_POOL", "liftoff_api")
+    CLICKHOUSE_POOL = os.getenv("LIFTOFF_CLICKHOUSE_POOL", "clickhouse_load")
+    DIMENSION_ENTITIES = ("app", "campaign", "creative")
+    # report windows posted and loaded by one mapped task group, raised
+    # as needed to stay within [core] max_map_length
+    REPORT_WINDOWS_PER_TASK = int(os.getenv("LIFTOFF_REPORT_WINDOWS_PER_TASK", 1))
+    # downloaded reports wait here for their load task, must be shared by the workers
+    REPORT_CACHE_DIRECTORY = os.getenv("LIFTOFF_REPORT_CACHE_DIR", "src/app/data/report_cache")
 
 
 class ClickHouseProd:
@@ -25,4 +121,29 @@ class ClickHouseProd:
     PORT = os.getenv("CLICKHOUSE_PROD_PORT")
     USER = os.getenv("CLICKHOUSE_PROD_USER")
     PASSWORD = os.getenv("CLICKHOUSE_PROD_PASSWORD")
-    DB_NAME = os.getenv("CLICKHOUSE_PROD_DB")
\ No newline at end of file
+    DB_NAME = os.getenv("CLICKHOUSE_PROD_DB")
+    COMPRESSION = os.getenv("CLICKHOUSE_COMPRESSION", "lz4") # lz4, zstd or gzip
+    POOL_MAX_SIZE = int(os.getenv("CLICKHOUSE_POOL_MAX_SIZE", 16))
+    POOL_CHECKOUT_TIMEOUT = 60
+    POOL_HEALTH_CHECK_INTERVAL = 30 # idle clients older than this are pinged before reuse
+
+
+class ClickHouseInsert:
+    BLOCK_SIZE = int(os.getenv("CLICKHOUSE_INSERT_BLOCK_SIZE", 100_000))
+    ASYNC_INSERT = os.getenv("CLICKHOUSE_ASYNC_INSERT", "false").lower() == "true"
+    WAIT_FOR_ASYNC_INSERT = os.getenv("CLICKHOUSE_WAIT_FOR_ASYNC_INSERT", "true").lower() == "true"
+    MAX_ATTEMPTS = int(os.getenv("CLICKHOUSE_INSERT_MAX_ATTEMPTS", 3))
+    RETRY_DELAY = 2
+    REPORT_LOAD_MODE = os.getenv("LIFTOFF_REPORT_LOAD_MODE", "append") # append or replace
+    STAGING_LAYOUT = os.getenv("LIFTOFF_STAGING_LAYOUT", "per_account") # per_account or consolidated
+    # lock of the partition swaps of a table: memory within one process, redis across workers
+    REPLACE_LOCK_BACKEND = os.getenv("LIFTOFF_REPLACE_LOCK_BACKEND", "memory")
+    REPLACE_LOCK_REDIS_URL = os.getenv("LIFTOFF_REPLACE_LOCK_REDIS_URL", "redis://redis:6379/1")
+    REPLACE_LOCK_KEY_PREFIX = "liftoff:replace_lock:"
+    REPLACE_LOCK_TIMEOUT = 10 * 60 # released by redis if the holder dies
+    REPLACE_LOCK_BLOCKING_TIMEOUT = 30 * 60
+
+
+class SQLite:
+    REPORT_REGISTRY_PATH = os.getenv("LIFTOFF_REPORT_REGISTRY_PATH", "src/app/data/liftoff_report_registry.sqlite3")
+    BACKFILL_CHECKPOINT_PATH = os.getenv("LIFTOFF_BACKFILL_CHECKPOINT_PATH", "src/app/data/liftoff_backfill_checkpoint.sqlite3")
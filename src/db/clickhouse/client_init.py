@@ -1,4 +1,7 @@
-from typing import Optional
+from typing import Optional, Any, Iterator
+from contextlib import contextmanager
+from threading import Condition, Lock
+from time import monotonic
 
 import clickhouse_connect
 from clickhouse_connect.driver.client import Client
@@ -11,21 +14,194 @@ def create_client(
         port: Optional[str] = config.ClickHouseProd.PORT,
         user: Optional[str] = config.ClickHouseProd.USER,
         password: Optional[str] = config.ClickHouseProd.PASSWORD,
-        db_name: Optional[str] = config.ClickHouseProd.DB_NAME
+        db_name: Optional[str] = config.ClickHouseProd.DB_NAME,
+        compress: Optional[str] = config.ClickHouseProd.COMPRESSION
 ) -> Client:
     client = clickhouse_connect.get_client(
         host=host,
         port=port,
         username=user,
-        password=password
+        password=password,
+        compress=compress
     )
     return client
 
 
+class ClientPoolTimeout(TimeoutError):
+    pass
+
+
+class ClickHouseClientPool:
+    """
+    Clients of one connection config. A client is handed out to one thread
+    at a time (a clickhouse-connect session can't run concurrent queries),
+    created lazily up to max_size and pinged before reuse when it has been
+    idle longer than health_check_interval; dead clients are replaced.
+    """
+
+    def __init__(
+            self,
+            connection: dict[str, Any],
+            max_size: Optional[int] = config.ClickHouseProd.POOL_MAX_SIZE,
+            checkout_timeout: Optional[float] = config.ClickHouseProd.POOL_CHECKOUT_TIMEOUT,
+            health_check_interval: Optional[float] = config.ClickHouseProd.POOL_HEALTH_CHECK_INTERVAL
+    ) -> None:
+        self.connection = connection
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.idle: list[tuple[Client, float]] = []
+        self.size = 0
+        self.condition = Condition()
+
+    def acquire(self) -> Client:
+        deadline = monotonic() + self.checkout_timeout
+        while True:
+            with self.condition:
+                while not self.idle and self.size >= self.max_size:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        raise ClientPoolTimeout(f"No free ClickHouse client in {self.checkout_timeout}s")
+                    self.condition.wait(remaining)
+                if self.idle:
+                    client, released = self.idle.pop()
+                else:
+                    client, released = None, None
+                    self.size += 1
+            if client is None:
+                try:
+                    return create_client(**self.connection)
+                except Exception:
+                    self.discard()
+                    raise
+            if monotonic() - released < self.health_check_interval or self.is_healthy(client):
+                return client
+            self.discard(client)
+
+    def release(self, client: Client) -> None:
+        with self.condition:
+            self.idle.append((client, monotonic()))
+            self.condition.notify()
+
+    def discard(self, client: Optional[Client] = None) -> None:
+        if client is not None:
+            client.close()
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def is_healthy(self, client: Client) -> bool:
+        try:
+            return client.ping()
+        except Exception:
+            return False
+
+    @contextmanager
+    def checkout(self) -> Iterator[Client]:
+        client = self.acquire()
+        healthy = True
+        try:
+            yield client
+        except Exception:
+            healthy = self.is_healthy(client)
+            raise
+        finally:
+            if healthy:
+                self.release(client)
+            else:
+                self.discard(client)
+
+    def close(self) -> None:
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+        for client, _ in idle:
+            client.close()
+
+
+class PooledClient:
+    """
+    Drop-in for the Client methods the app uses: every call checks out a
+    client of the pool for its own duration only, so one instance can be
+    shared by all threads.
+    """
+
+    def __init__(self, pool: ClickHouseClientPool) -> None:
+        self.pool = pool
+
+    def query(self, *args, **kwargs) -> Any:
+        with self.pool.checkout() as client:
+            return client.query(*args, **kwargs)
+
+    def command(self, *args, **kwargs) -> Any:
+        with self.pool.checkout() as client:
+            return client.command(*args, **kwargs)
+
+    def insert(self, *args, **kwargs) -> Any:
+        with self.pool.checkout() as client:
+            return client.insert(*args, **kwargs)
+
+    def insert_df(self, *args, **kwargs) -> Any:
+        with self.pool.checkout() as client:
+            return client.insert_df(*args, **kwargs)
+
+    def create_insert_context(self, *args, **kwargs) -> Any:
+        with self.pool.checkout() as client:
+            return client.create_insert_context(*args, **kwargs)
+
+    def ping(self) -> bool:
+        with self.pool.checkout() as client:
+            return client.ping()
+
+
+class ClickHouseClientRegistry:
+
+    def __init__(self) -> None:
+        self.pools: dict[tuple, ClickHouseClientPool] = {}
+        self.lock = Lock()
+
+    def get_pool(self, **connection) -> ClickHouseClientPool:
+        key = tuple(sorted(connection.items()))
+        with self.lock:
+            if key not in self.pools:
+                self.pools[key] = ClickHouseClientPool(connection)
+            return self.pools[key]
+
+    def close(self) -> None:
+        with self.lock:
+            pools, self.pools = self.pools, {}
+        for pool in pools.values():
+            pool.close()
+
+
+registry = ClickHouseClientRegistry()
+
+
+def get_client(
+        host: Optional[str] = config.ClickHouseProd.HOST,
+        port: Optional[str] = config.ClickHouseProd.PORT,
+        user: Optional[str] = config.ClickHouseProd.USER,
+        password: Optional[str] = config.ClickHouseProd.PASSWORD,
+        db_name: Optional[str] = config.ClickHouseProd.DB_NAME,
+        compress: Optional[str] = config.ClickHouseProd.COMPRESSION
+) -> PooledClient:
+    """
+    Shared client of the process-wide pool for this connection config.
+    """
+    return PooledClient(registry.get_pool(
+        host=host,
+        port=port,
+        user=user,
+        password=password,
+        db_name=db_name,
+        compress=compress
+    ))
+
+
 def main() -> None:
-    ch_client = create_client()
+    ch_client = get_client()
     print(ch_client.ping())
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -6,17 +6,69 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+ST_LIFTOFF_DB_PREFIX = "st_liftoff_"
+
+
 class ModelFactory(ABC):
     DB_NAME = None
     TABLE_NAME = None
+    # column -> ClickHouse type in insert order, None to take them from the table
+    COLUMNS: dict[str, str] = None
 
 
 class LiftoffStagingReportModel(ModelFactory):
     TABLE_NAME = os.getenv("TABLE_NAME_LIFTOFF_STAGING_REPORT")
+    COLUMNS = {
+        "id": "UUID",
+        "start_time": "Date",
+        "end_time": "Date",
+        "date": "Date",
+        "app_id": "String",
+        "campaign_id": "Nullable(String)",
+        "creative_id": "Nullable(String)",
+        "country_code": "Nullable(String)",
+        "publisher_app_store_id": "Nullable(String)",
+        "publisher_name": "Nullable(String)",
+        "ad_format": "Nullable(String)",
+        "is_interstitial": "Nullable(Bool)",
+        "video_starts": "Nullable(Int64)",
+        "video_plays_at_25_percent": "Nullable(Int64)",
+        "video_plays_at_50_percent": "Nullable(Int64)",
+        "video_plays_at_75_percent": "Nullable(Int64)",
+        "video_completes": "Nullable(Int64)",
+        "spend": "Nullable(Float64)",
+        "impressions": "Nullable(Int64)",
+        "clicks": "Nullable(Int64)",
+        "installs": "Nullable(Int64)",
+        "event_name": "Nullable(String)",
+        "cpm": "Nullable(Float64)",
+        "cpc": "Nullable(Float64)",
+        "ctr": "Nullable(Float64)",
+        "cpi": "Nullable(Float64)",
+        "cpa": "Nullable(Float64)",
+        "skan_installs_with_no_conversion_value": "Nullable(Int64)",
+        "skan_installs_with_conversion_value": "Nullable(Int64)",
+        "created": "DateTime",
+        "updated": "DateTime",
+    }
 
 
 class LiftoffStagingAppModel(ModelFactory):
     TABLE_NAME = os.getenv("TABLE_NAME_LIFTOFF_STAGING_APP")
+    COLUMNS = {
+        "id": "UUID",
+        "app_id": "String",
+        "name": "Nullable(String)",
+        "app_store_id": "Nullable(String)",
+        "bundle_id": "Nullable(String)",
+        "title": "Nullable(String)",
+        "platform": "Nullable(String)",
+        "optimization_event_id": "Nullable(String)",
+        "optimization_event_name": "Nullable(String)",
+        "state": "Nullable(String)",
+        "created": "DateTime",
+        "updated": "DateTime",
+    }
 
 
 class LiftoffStagingCreativeModel(ModelFactory):
@@ -30,4 +82,87 @@ class LiftoffStagingCampaignModel(ModelFactory):
 class LiftoffSecretAccountModel(ModelFactory):
     DB_NAME = os.getenv("DB_NAME_SECRET")
     TABLE_NAME = os.getenv("TABLE_NAME_SECRET_ACCOUNT")
-    FULL_NAME = DB_NAME + "." + TABLE_NAME
\ No newline at end of file
+    FULL_NAME = DB_NAME + "." + TABLE_NAME
+
+class LiftoffConsolidatedModelFactory(ModelFactory):
+    """
+    One table per entity for all accounts, api_key leads the sort key.
+    The partitions never split by account, so a buffered insert of many
+    accounts stays within max_partitions_per_insert_block: dimension tables
+    have none and the report table one per month. ReplacingMergeTree keeps
+    the last version of a row id.
+    """
+    DB_NAME = os.getenv("DB_NAME_LIFTOFF_CONSOLIDATED", "liftoff")
+    PARTITION_BY: str = None
+    ORDER_BY: tuple[str] = None
+    VERSION_COLUMN = "updated"
+
+    @classmethod
+    def create_database_query(cls) -> str:
+        return f"CREATE DATABASE IF NOT EXISTS `{cls.DB_NAME}`"
+
+    @classmethod
+    def create_table_query(cls) -> str:
+        columns = ",\n".join(f"    `{name}` {type}" for name, type in cls.COLUMNS.items())
+        partition_by = "" if cls.PARTITION_BY is None else f"PARTITION BY {cls.PARTITION_BY}\n"
+        return (
+            f"CREATE TABLE IF NOT EXISTS `{cls.DB_NAME}`.`{cls.TABLE_NAME}`\n(\n{columns}\n)\n"
+            f"ENGINE = ReplacingMergeTree({cls.VERSION_COLUMN})\n"
+            f"{partition_by}"
+            f"ORDER BY ({', '.join(cls.ORDER_BY)})"
+        )
+
+
+class LiftoffConsolidatedReportModel(LiftoffConsolidatedModelFactory):
+    TABLE_NAME = os.getenv("TABLE_NAME_LIFTOFF_CONSOLIDATED_REPORT", "staging_report")
+    COLUMNS = {"api_key": "String", **LiftoffStagingReportModel.COLUMNS}
+    PARTITION_BY = "toYYYYMM(date)"
+    ORDER_BY = ("api_key", "date", "id")
+
+
+class LiftoffConsolidatedAppModel(LiftoffConsolidatedModelFactory):
+    TABLE_NAME = os.getenv("TABLE_NAME_LIFTOFF_CONSOLIDATED_APP", "staging_app")
+    COLUMNS = {"api_key": "String", **LiftoffStagingAppModel.COLUMNS}
+    ORDER_BY = ("api_key", "app_id")
+
+
+class LiftoffConsolidatedCreativeModel(LiftoffConsolidatedModelFactory):
+    TABLE_NAME = os.getenv("TABLE_NAME_LIFTOFF_CONSOLIDATED_CREATIVE", "staging_creative")
+    COLUMNS = {
+        "api_key": "String",
+        "id": "UUID",
+        "creative_id": "String",
+        "name": "Nullable(String)",
+        "preview_url": "Nullable(String)",
+        "full_html_preview_url": "Nullable(String)",
+        "width": "Nullable(Int64)",
+        "height": "Nullable(Int64)",
+        "video_duration": "Nullable(Float64)",
+        "video_url": "Nullable(String)",
+        "creative_type": "Nullable(String)",
+        "state": "Nullable(String)",
+        "created": "DateTime",
+        "updated": "DateTime",
+    }
+    ORDER_BY = ("api_key", "creative_id")
+
+
+class LiftoffConsolidatedCampaignModel(LiftoffConsolidatedModelFactory):
+    TABLE_NAME = os.getenv("TABLE_NAME_LIFTOFF_CONSOLIDATED_CAMPAIGN", "staging_campaign")
+    COLUMNS = {
+        "api_key": "String",
+        "id": "UUID",
+        "campaign_id": "String",
+        "app_id": "Nullable(String)",
+        "name": "Nullable(String)",
+        "campaign_type": "Nullable(String)",
+        "tracker_type": "Nullable(String)",
+        "min_os_version": "Nullable(String)",
+        "max_os_version": "Nullable(String)",
+        "state": "Nullable(String)",
+        "state_last_changed_at": "Nullable(String)",
+        "demand_product": "Nullable(String)",
+        "created": "DateTime",
+        "updated": "DateTime",
+    }
+    ORDER_BY = ("api_key", "campaign_id")
@@ -0,0 +1,105 @@
+from typing import Optional, Iterable
+from contextlib import closing
+from threading import Lock
+from time import time
+import os
+import sqlite3
+
+from src import config
+
+
+class LiftoffBackfillCheckpoint:
+    """
+    Local store of backfill units (account x date window) and the last step
+    each of them reached, so an interrupted backfill resumes from there.
+    """
+
+    table_name = "liftoff_backfill_unit"
+    states = ("pending", "posted", "ready", "downloaded", "loaded", "failed")
+
+    def __init__(self, path: Optional[str] = config.SQLite.BACKFILL_CHECKPOINT_PATH) -> None:
+        self.path = path
+        self.lock = Lock()
+        self.create_table()
+
+    def connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create_table(self) -> None:
+        with self.lock, closing(self.connect()) as connection, connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table_name} (
+                    backfill_id TEXT NOT NULL,
+                    api_key TEXT NOT NULL,
+                    start_time TEXT NOT NULL,
+                    end_time TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    report_id TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    rows INTEGER,
+                    error TEXT,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (backfill_id, api_key, start_time, end_time)
+                )
+            """)
+
+    def add_units(self, backfill_id: str, units: Iterable[tuple[str, str, str]]) -> None:
+        """
+        Registers (api_key, start_time, end_time) units; known units keep their state.
+        """
+        now = time()
+        with self.lock, closing(self.connect()) as connection, connection:
+            connection.executemany(
+                f"""
+                    INSERT OR IGNORE INTO {self.table_name}
+                    (backfill_id, api_key, start_time, end_time, state, updated)
+                    VALUES (?, ?, ?, ?, 'pending', ?)
+                """,
+                [(backfill_id, api_key, start_time, end_time, now) for api_key, start_time, end_time in units]
+            )
+
+    def get_unfinished(self, backfill_id: str) -> list[dict]:
+        with self.lock, closing(self.connect()) as connection:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute(
+                f"""
+                    SELECT api_key, start_time, end_time, state, report_id, attempts
+                    FROM {self.table_name}
+                    WHERE backfill_id = ? AND state != 'loaded'
+                    ORDER BY start_time, api_key
+                """,
+                (backfill_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def update(
+            self,
+            backfill_id: str,
+            api_key: str,
+            start_time: str,
+            end_time: str,
+            state: str,
+            report_id: Optional[str] = None,
+            rows: Optional[int] = None,
+            error: Optional[str] = None,
+            attempt: Optional[bool] = False
+    ) -> None:
+        with self.lock, closing(self.connect()) as connection, connection:
+            connection.execute(
+                f"""
+                    UPDATE {self.table_name}
+                    SET state = ?, report_id = ?, rows = ?, error = ?, attempts = attempts + ?, updated = ?
+                    WHERE backfill_id = ? AND api_key = ? AND start_time = ? AND end_time = ?
+                """,
+                (state, report_id, rows, error, int(attempt), time(), backfill_id, api_key, start_time, end_time)
+            )
+
+    def get_summary(self, backfill_id: str) -> dict[str, int]:
+        with self.lock, closing(self.connect()) as connection:
+            rows = connection.execute(
+                f"SELECT state, count(*) FROM {self.table_name} WHERE backfill_id = ? GROUP BY state",
+                (backfill_id,)
+            ).fetchall()
+        return dict(rows)
@@ -0,0 +1,106 @@
+from typing import Optional, Iterable
+from contextlib import closing
+from threading import Lock
+from time import time
+import os
+import sqlite3
+
+from src import config
+
+
+class LiftoffReportRegistry:
+    """
+    Local registry of posted Liftoff reports, so runs and retries reuse a
+    report that is completed or still generating instead of posting it again.
+    """
+
+    table_name = "liftoff_report"
+    failed_states = ("failed", "cancelled", "expired")
+
+    def __init__(
+            self,
+            path: Optional[str] = config.SQLite.REPORT_REGISTRY_PATH,
+            ttl_hours: Optional[float] = config.LiftoffApi.PostReports.REPORT_TTL_HOURS
+    ) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_hours * 60 * 60
+        self.lock = Lock()
+        self.create_table()
+
+    def connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create_table(self) -> None:
+        with self.lock, closing(self.connect()) as connection, connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table_name} (
+                    api_key TEXT NOT NULL,
+                    start_time TEXT NOT NULL,
+                    end_time TEXT NOT NULL,
+                    group_by TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    report_id TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (api_key, start_time, end_time, group_by, format)
+                )
+            """)
+
+    def create_group_by_key(self, group_by: Iterable[str]) -> str:
+        return ",".join(group_by)
+
+    def find(
+            self,
+            api_key: str,
+            start_time: str,
+            end_time: str,
+            group_by: Iterable[str],
+            format: str
+    ) -> Optional[tuple[str, str]]:
+        """
+        Returns (report_id, state) of a report that is still valid and not failed.
+        """
+        with self.lock, closing(self.connect()) as connection:
+            row = connection.execute(
+                f"""
+                    SELECT report_id, state
+                    FROM {self.table_name}
+                    WHERE api_key = ? AND start_time = ? AND end_time = ?
+                        AND group_by = ? AND format = ? AND created >= ?
+                """,
+                (api_key, start_time, end_time, self.create_group_by_key(group_by), format, time() - self.ttl_seconds)
+            ).fetchone()
+        if row is None or row[1] in self.failed_states:
+            return None
+        return row
+
+    def register(
+            self,
+            api_key: str,
+            start_time: str,
+            end_time: str,
+            group_by: Iterable[str],
+            format: str,
+            report_id: str,
+            state: Optional[str] = "queued"
+    ) -> None:
+        now = time()
+        with self.lock, closing(self.connect()) as connection, connection:
+            connection.execute(
+                f"""
+                    INSERT OR REPLACE INTO {self.table_name}
+                    (api_key, start_time, end_time, group_by, format, report_id, state, created, updated)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (api_key, start_time, end_time, self.create_group_by_key(group_by), format, report_id, state, now, now)
+            )
+
+    def update_state(self, report_id: str, state: str) -> None:
+        with self.lock, closing(self.connect()) as connection, connection:
+            connection.execute(
+                f"UPDATE {self.table_name} SET state = ?, updated = ? WHERE report_id = ?",
+                (state, time(), report_id)
+            )
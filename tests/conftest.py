@@ -0,0 +1,6 @@
+import os
+
+# src.db.clickhouse.models reads these at import time
+os.environ.setdefault("DB_NAME_SECRET", "secret")
+os.environ.setdefault("TABLE_NAME_SECRET_ACCOUNT", "account")
+os.environ.setdefault("LIFTOFF_METRICS_BACKEND", "none")
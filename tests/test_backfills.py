@@ -0,0 +1,62 @@
+from requests import HTTPError, Response
+
+from src.app.backfills import liftoff as bf_lift
+from src.db.sqlite import backfill_checkpoint, report_registry
+
+
+class FakeELTReport:
+    """
+    Serves the reports it posted itself, any other report id is gone (404).
+    """
+
+    posted: list[str] = []
+    registry: report_registry.LiftoffReportRegistry = None
+
+    def __init__(self, api_key: str, **kwargs) -> None:
+        self.api_key = api_key
+
+    def post_report(self, start_time: str, end_time: str) -> str:
+        self.posted.append(f"report-{len(self.posted) + 1}")
+        return self.posted[-1]
+
+    def check_report_status(self, id: str) -> bool:
+        return True
+
+    def download_report(self, id: str) -> int:
+        if id not in self.posted:
+            response = Response()
+            response.status_code = 404
+            raise HTTPError("404 Client Error: Not Found", response=response)
+        return 1
+
+    def load_report_streaming(self, id: str, start_time: str, end_time: str) -> int:
+        return 5
+
+
+def test_resumed_unit_with_an_expired_report_is_posted_again(tmp_path, monkeypatch):
+    checkpoint = backfill_checkpoint.LiftoffBackfillCheckpoint(str(tmp_path / "checkpoint.sqlite3"))
+    registry = report_registry.LiftoffReportRegistry(str(tmp_path / "registry.sqlite3"))
+    registry.register("account", "2025-06-01", "2025-06-08", ["date"], "csv", "expired-report")
+    monkeypatch.setattr(FakeELTReport, "posted", [])
+    monkeypatch.setattr(FakeELTReport, "registry", registry)
+    monkeypatch.setattr(bf_lift.orchestrator, "ELTReport", FakeELTReport)
+    backfill = bf_lift.ReportBackfill(
+        "test",
+        "2025-06-01",
+        "2025-06-08",
+        api_keys=["account"],
+        window_days=7,
+        checkpoint=checkpoint,
+        cache=object(),
+        secret_provider=object()
+    )
+    backfill.plan()
+    checkpoint.update("test", "account", "2025-06-01", "2025-06-08", "ready", "expired-report")
+
+    assert backfill.run() == {"pending": 1}
+    [unit] = checkpoint.get_unfinished("test")
+    assert unit["report_id"] is None and unit["attempts"] == 1
+    assert registry.find("account", "2025-06-01", "2025-06-08", ["date"], "csv") is None
+
+    assert backfill.run() == {"loaded": 1}
+    assert FakeELTReport.posted == ["report-1"]
@@ -0,0 +1,74 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import pytest
+
+from src.app.extractors import liftoff as ex_lift
+from src.app.limiters import liftoff as lm_lift
+
+
+class FakeClock:
+
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    """
+    Answers the first request with 429 and Retry-After, the rest with 200.
+    """
+
+    hits = 0
+
+    def do_GET(self) -> None:
+        type(self).hits += 1
+        if type(self).hits == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "3")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"[]")
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server():
+    RateLimitedHandler.hits = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RateLimitedHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_429_with_retry_after_reaches_the_limiter(server, monkeypatch):
+    monkeypatch.setattr(ex_lift.APIExtractorFactory, "_session", ex_lift.create_session())
+    clock = FakeClock()
+    limiter = lm_lift.AdaptiveRateLimiter(
+        lm_lift.InProcessTokenBucketBackend(clock),
+        rate=4.0,
+        capacity=4.0,
+        min_rate=0.1,
+        max_rate=10.0,
+        decrease_factor=0.5,
+        sleep_func=clock.sleep
+    )
+    extractor = ex_lift.APIGetAppsExtractor("account", "secret")
+    extractor.set_limiter(limiter)
+    response = extractor.send_rate_limited("GET", f"http://127.0.0.1:{server.server_port}/apps")
+    assert response.status_code == 200
+    assert RateLimitedHandler.hits == 2
+    # the retry waited for Retry-After in the limiter, at the halved rate
+    assert clock.now >= 1003.0
+    key = limiter.create_key("account", "apps")
+    assert limiter.backend.buckets[key]["rate"] < 4.0
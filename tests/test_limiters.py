@@ -0,0 +1,122 @@
+import pytest
+from requests import Response
+
+from src.app.limiters import liftoff as lm_lift
+
+
+class FakeClock:
+
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def create_response(status_code: int, retry_after: str = None) -> Response:
+    response = Response()
+    response.status_code = status_code
+    if retry_after is not None:
+        response.headers["Retry-After"] = retry_after
+    return response
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+def create_limiter(clock: FakeClock, **kwargs) -> lm_lift.AdaptiveRateLimiter:
+    kwargs = {"rate": 1.0, "capacity": 2.0, "min_rate": 0.1, "max_rate": 10.0, **kwargs}
+    return lm_lift.AdaptiveRateLimiter(
+        lm_lift.InProcessTokenBucketBackend(clock),
+        sleep_func=clock.sleep,
+        **kwargs
+    )
+
+
+def test_bucket_allows_the_burst_then_paces_requests(clock):
+    limiter = create_limiter(clock)
+    key = limiter.create_key("account", "reports")
+    assert limiter.acquire(key) == 0
+    assert limiter.acquire(key) == 0
+    assert limiter.acquire(key) == pytest.approx(1.0)
+    assert clock.now == pytest.approx(1001.0)
+
+
+def test_429_cuts_the_rate_and_blocks_for_retry_after(clock):
+    limiter = create_limiter(clock, rate=4.0, decrease_factor=0.5)
+    key = limiter.create_key("account", "reports")
+    limiter.on_response(key, create_response(429, "3"))
+    assert limiter.backend.take(key, limiter.capacity, limiter.rate) == pytest.approx(3.0)
+    clock.sleep(3.0)
+    # the bucket is empty when the block ends and refills at the halved rate
+    assert limiter.backend.take(key, limiter.capacity, limiter.rate) == pytest.approx(1 / 2.0)
+
+
+def test_block_of_a_new_bucket_uses_the_limiter_rate(clock):
+    backend = lm_lift.InProcessTokenBucketBackend(clock)
+    backend.block("account:reports", 2.0, 4.0)
+    clock.sleep(2.0)
+    assert backend.take("account:reports", 10.0, 4.0) == pytest.approx(1 / 4.0)
+
+
+def test_successful_responses_raise_the_rate_up_to_max_rate(clock):
+    limiter = create_limiter(clock, rate=1.0, max_rate=1.1, increase_step=0.05)
+    key = limiter.create_key("account", "apps")
+    for _ in range(5):
+        limiter.on_response(key, create_response(200))
+    assert limiter.backend.buckets[key]["rate"] == pytest.approx(1.1)
+
+
+def test_server_errors_do_not_change_the_rate(clock):
+    limiter = create_limiter(clock, rate=2.0)
+    key = limiter.create_key("account", "apps")
+    limiter.acquire(key)
+    limiter.on_response(key, create_response(503))
+    assert limiter.backend.buckets[key]["rate"] == pytest.approx(2.0)
+
+
+def test_retry_after_accepts_seconds_and_http_dates(clock):
+    limiter = create_limiter(clock, default_retry_after=7)
+    assert limiter.get_retry_after(create_response(429, "12")) == 12
+    assert limiter.get_retry_after(create_response(429, "Wed, 21 Oct 2015 07:28:00 GMT")) == 0
+    assert limiter.get_retry_after(create_response(429, "soon")) == 7
+    assert limiter.get_retry_after(create_response(429)) == 7
+
+
+@pytest.fixture
+def redis_server():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return fakeredis.FakeServer()
+
+
+def create_redis_backend(redis_server) -> lm_lift.RedisTokenBucketBackend:
+    import fakeredis
+
+    return lm_lift.RedisTokenBucketBackend(client=fakeredis.FakeRedis(server=redis_server))
+
+
+def test_redis_bucket_is_shared_between_workers(redis_server):
+    first, second = create_redis_backend(redis_server), create_redis_backend(redis_server)
+    assert first.take("account:reports", 2.0, 1.0) == 0
+    assert second.take("account:reports", 2.0, 1.0) == 0
+    assert 0 < first.take("account:reports", 2.0, 1.0) <= 1.0
+
+
+def test_redis_block_keeps_the_limiter_rate(redis_server):
+    backend = create_redis_backend(redis_server)
+    backend.block("account:reports", 5.0, 4.0)
+    assert 4.9 < backend.take("account:reports", 10.0, 1.0) <= 5.0
+    assert float(backend.client.hget(backend.create_key("account:reports"), "rate")) == 4.0
+
+
+def test_redis_scale_rate_is_bounded(redis_server):
+    backend = create_redis_backend(redis_server)
+    assert backend.scale_rate("account:apps", 0.5, 0.0, 1.0, 10.0, 4.0) == 2.0
+    assert backend.scale_rate("account:apps", 0.5, 0.0, 1.0, 10.0, 4.0) == 1.0
+    assert backend.scale_rate("account:apps", 0.5, 0.0, 1.0, 10.0, 4.0) == 1.0
@@ -0,0 +1,198 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from types import SimpleNamespace
+from datetime import date
+
+from clickhouse_connect.driver.exceptions import OperationalError
+from clickhouse_connect.driver.insert import InsertContext
+import pytest
+
+from src import config
+from src.app.loaders import liftoff as ld_lift
+from src.app.metrics import liftoff as mt_lift
+from src.db.clickhouse import models
+
+
+class FakeClient:
+    """
+    Consumes the insert context the way the HTTP client does and fails
+    the first `failures` inserts after reading their first block.
+    """
+
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.rows: list[tuple] = []
+        self.commands: list[str] = []
+        self.lock = Lock()
+
+    def command(self, query: str, parameters: dict = None) -> None:
+        self.commands.append(query)
+
+    def query(self, query: str, parameters: dict = None) -> SimpleNamespace:
+        return SimpleNamespace(result_rows=[("202506",)])
+
+    def create_insert_context(
+            self,
+            table: str,
+            column_names: list[str],
+            database: str = None,
+            column_types: list = None,
+            column_type_names: list[str] = None,
+            column_oriented: bool = False,
+            settings: dict = None,
+            data: list = None
+    ) -> InsertContext:
+        return InsertContext(
+            f"{database}.{table}",
+            column_names,
+            column_types,
+            data,
+            column_oriented=column_oriented,
+            settings=settings
+        )
+
+    def insert(self, context: InsertContext) -> None:
+        rows = []
+        for block in context.next_block():
+            rows.extend(zip(*block.column_data))
+            with self.lock:
+                if self.failures:
+                    self.failures -= 1
+                    raise OperationalError("connection reset")
+        with self.lock:
+            self.rows.extend(rows)
+
+
+def create_loader(client: FakeClient) -> ld_lift.LoaderFactory:
+    return ld_lift.GetReportsIdDataStagingLoader(model=models.LiftoffStagingReportModel, ch_client=client)
+
+
+def create_columns(size: int, offset: int = 0) -> dict[str, list]:
+    return {"app_id": [f"app-{offset + i}" for i in range(size)], "impressions": list(range(offset, offset + size))}
+
+
+def test_retried_insert_sends_every_row(monkeypatch):
+    monkeypatch.setattr(ld_lift, "sleep", lambda seconds: None)
+    client = FakeClient(failures=1)
+    loader = create_loader(client)
+    assert loader.load_columns_to_clickhouse(create_columns(25), "db", "report", block_size=10) == 25
+    names = list(models.LiftoffStagingReportModel.COLUMNS)
+    loaded = [row[names.index("impressions")] for row in client.rows]
+    assert sorted(loaded) == list(range(25))
+
+
+def test_concurrent_inserts_of_one_loader_do_not_mix(monkeypatch):
+    monkeypatch.setattr(ld_lift, "sleep", lambda seconds: None)
+    client = FakeClient(failures=2)
+    loader = create_loader(client)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        sizes = list(executor.map(
+            lambda offset: loader.load_columns_to_clickhouse(create_columns(100, offset), "db", "report", block_size=30),
+            range(0, 800, 100)
+        ))
+    names = list(models.LiftoffStagingReportModel.COLUMNS)
+    loaded = [row[names.index("impressions")] for row in client.rows]
+    assert sum(sizes) == 800
+    assert sorted(loaded) == list(range(800))
+
+
+def create_app_columns(size: int) -> dict[str, list]:
+    return {"app_id": [f"app-{i}" for i in range(size)]}
+
+
+def test_buffered_rows_count_only_after_the_flush(monkeypatch):
+    monkeypatch.setattr(ld_lift, "sleep", lambda seconds: None)
+    client = FakeClient()
+    loader = ld_lift.ConsolidatedStagingLoader(models.LiftoffConsolidatedAppModel, ch_client=client, buffer_size=5)
+    assert loader.add_batch("first", create_app_columns(3)) == 0
+    assert loader.pop_account("first") == 0
+    assert loader.add_batch("second", create_app_columns(4)) == 0
+    loader.add_batch("first", create_app_columns(1))
+    loader.flush()
+    assert len(client.rows) == 8
+    assert loader.pop_account("first") == 4
+    assert loader.pop_account("second") == 4
+    assert loader.pop_account("first") == 0
+
+
+def test_failed_flush_is_reported_to_every_account_in_the_buffer(monkeypatch):
+    monkeypatch.setattr(ld_lift, "sleep", lambda seconds: None)
+    client = FakeClient(failures=config.ClickHouseInsert.MAX_ATTEMPTS)
+    loader = ld_lift.ConsolidatedStagingLoader(models.LiftoffConsolidatedAppModel, ch_client=client, buffer_size=10)
+    loader.add_batch("first", create_app_columns(2))
+    loader.add_batch("second", create_app_columns(2))
+    with pytest.raises(OperationalError):
+        loader.flush()
+    for api_key in ("first", "second"):
+        with pytest.raises(RuntimeError):
+            loader.pop_account(api_key)
+
+
+def test_consolidated_tables_are_not_partitioned_by_account():
+    assert "PARTITION BY" not in models.LiftoffConsolidatedAppModel.create_table_query()
+    assert "PARTITION BY toYYYYMM(date)\n" in models.LiftoffConsolidatedReportModel.create_table_query()
+
+
+def test_memory_replace_lock_is_shared_by_the_loaders_of_a_table():
+    first = ld_lift.LoaderFactory.get_replace_lock("db", "report", backend="memory")
+    assert first is ld_lift.LoaderFactory.get_replace_lock("db", "report", backend="memory")
+    assert first is not ld_lift.LoaderFactory.get_replace_lock("db", "app", backend="memory")
+
+
+def test_redis_replace_lock_is_held_across_clients(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(ld_lift, "_replace_lock_client", fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(config.ClickHouseInsert, "REPLACE_LOCK_BLOCKING_TIMEOUT", 0.1)
+    other = fakeredis.FakeRedis(server=server).lock(f"{config.ClickHouseInsert.REPLACE_LOCK_KEY_PREFIX}db.report")
+    with ld_lift.LoaderFactory.get_replace_lock("db", "report", backend="redis"):
+        assert not other.acquire(blocking=False)
+    assert other.acquire(blocking=False)
+
+
+def test_replace_copies_the_rest_of_the_partition_on_the_server_before_the_swap(monkeypatch):
+    monkeypatch.setattr(ld_lift, "sleep", lambda seconds: None)
+    client = FakeClient()
+    loader = create_loader(client)
+    rows = loader.replace_window_in_clickhouse(
+        [create_columns(5)],
+        date(2025, 6, 8),
+        date(2025, 6, 15),
+        db_name="db",
+        table_name="report",
+        run_load=ld_lift.run_directly
+    )
+    assert rows == 5 and len(client.rows) == 5
+    create, copy, swap, drop = client.commands
+    assert create.startswith("CREATE TABLE `db`.`report_tmp_")
+    assert copy.startswith("INSERT INTO `db`.`report_tmp_") and "NOT (date >= %(start)s AND date < %(end)s)" in copy
+    assert swap.startswith("ALTER TABLE `db`.`report` REPLACE PARTITION ID")
+    assert drop.startswith("DROP TABLE IF EXISTS `db`.`report_tmp_")
+
+
+def test_insert_metrics_carry_the_account_and_entity_tags(tmp_path, monkeypatch):
+    monkeypatch.setattr(ld_lift, "sleep", lambda seconds: None)
+    backend = mt_lift.PrometheusTextfileBackend(str(tmp_path / "liftoff.prom"), prefix="liftoff")
+    loader = create_loader(FakeClient(failures=1))
+    loader.metrics = mt_lift.PipelineMetrics(backend)
+    loader.load_batch_to_clickhouse(create_columns(5), "db", "report", tags={"account": "first", "entity": "report"})
+    tags = (("account", "first"), ("entity", "report"), ("table", "report"))
+    assert backend.counters[("liftoff_clickhouse_insert_retries", tags)] == 1
+    assert backend.histograms[("liftoff_clickhouse_insert_seconds", tags)][2] == 1
+
+
+def test_buffered_insert_metrics_are_tagged_by_account_only_for_one_account(tmp_path, monkeypatch):
+    monkeypatch.setattr(ld_lift, "sleep", lambda seconds: None)
+    backend = mt_lift.PrometheusTextfileBackend(str(tmp_path / "liftoff.prom"), prefix="liftoff")
+    loader = ld_lift.ConsolidatedStagingLoader(models.LiftoffConsolidatedAppModel, ch_client=FakeClient(), buffer_size=10)
+    loader.metrics = mt_lift.PipelineMetrics(backend)
+    loader.add_batch("first", create_app_columns(2), {"account": "first", "entity": "app"})
+    loader.flush()
+    loader.add_batch("first", create_app_columns(2), {"account": "first", "entity": "app"})
+    loader.add_batch("second", create_app_columns(2), {"account": "second", "entity": "app"})
+    loader.flush()
+    table = models.LiftoffConsolidatedAppModel.TABLE_NAME
+    assert {tags for name, tags in backend.histograms} == {
+        (("account", "first"), ("entity", "app"), ("table", table)),
+        (("entity", "app"), ("table", table))
+    }
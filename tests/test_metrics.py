@@ -0,0 +1,22 @@
+from src.app.metrics import liftoff as mt_lift
+
+
+def test_prometheus_label_values_are_escaped(tmp_path):
+    backend = mt_lift.PrometheusTextfileBackend(str(tmp_path / "liftoff.prom"))
+    backend.incr("api.requests", 1, {"endpoint": 'a"b\\c\nd'})
+    assert 'liftoff_api_requests_total{endpoint="a\\"b\\\\c\\nd"} 1' in backend.create_lines()
+
+
+def test_airflow_stat_name_carries_the_tags_without_tag_support():
+    backend = mt_lift.StatsdMetricsBackend()
+    backend.stats_tags = False
+    assert backend.create_stat_name("stage.seconds", {"stage": "load", "account": "a.b c"}) == (
+        "liftoff.stage.seconds.account_a_b_c.stage_load"
+    )
+    backend.stats_tags = True
+    assert backend.create_stat_name("stage.seconds", {"stage": "load"}) == "liftoff.stage.seconds"
+
+
+def test_dogstatsd_tag_values_do_not_break_the_line():
+    backend = mt_lift.StatsdMetricsBackend()
+    assert backend.clean_tag_value("a,b|c#d e") == "a_b_c_d_e"
@@ -0,0 +1,121 @@
+from threading import Lock
+from types import SimpleNamespace
+
+import pytest
+from requests import HTTPError
+
+from src.app import custom_orchestrator as orch
+from src.db.sqlite import report_registry
+
+
+class RecordingRunner(orch.StageRunner):
+
+    def __init__(self) -> None:
+        self.active: list[str] = []
+        self.steps: list[str] = []
+        self.lock = Lock()
+
+    def run_stage(self, stage: str, func, *args):
+        with self.lock:
+            assert not self.active, f"{stage} runs inside {self.active}"
+            self.active.append(stage)
+            self.steps.append(stage)
+        try:
+            return func(*args)
+        finally:
+            with self.lock:
+                self.active.remove(stage)
+
+
+class FakeLoader:
+
+    def __init__(self) -> None:
+        self.batches = []
+
+    def create_st_liftoff_db_name(self, api_key: str) -> str:
+        return f"st_{api_key}"
+
+    def load_batches_to_clickhouse(self, batches, db_name=None, table_name=None, run_load=None, tags=None) -> int:
+        rows = 0
+        for batch in batches:
+            rows += run_load(self.load_batch, batch)
+        return rows
+
+    def load_batch(self, batch: dict) -> int:
+        self.batches.append(batch)
+        return len(batch["impressions"])
+
+
+@pytest.fixture
+def elt(tmp_path, monkeypatch) -> orch.ELTReport:
+    registry = report_registry.LiftoffReportRegistry(str(tmp_path / "registry.sqlite3"))
+    elt = orch.ELTReport("account", "secret", staging_layout="per_account", registry=registry, load_mode="append")
+    elt.loader = FakeLoader()
+    monkeypatch.setattr(elt, "extract_batches", lambda id: iter([{"impressions": [1, 2]}, {"impressions": [3]}]))
+    monkeypatch.setattr(elt, "enrich_report_batch", lambda batch, start_time, end_time: batch)
+    return elt
+
+
+def test_report_batches_take_every_stage_one_at_a_time(elt):
+    runner = RecordingRunner()
+    assert elt.load_report_streaming("report", "2025-06-01", "2025-06-08", runner) == 3
+    assert runner.steps == ["extract", "enrich", "load", "extract", "enrich", "load", "extract"]
+
+
+def test_stage_runner_submit_returns_the_completed_task():
+    runner = orch.StageRunner()
+    assert runner.submit(sum, [1, 2]).result() == 3
+    with pytest.raises(ZeroDivisionError):
+        runner.submit(divmod, 1, 0).result()
+
+
+def test_non_streaming_elt_replaces_the_window_in_replace_mode(tmp_path, monkeypatch):
+    registry = report_registry.LiftoffReportRegistry(str(tmp_path / "registry.sqlite3"))
+    elt = orch.ELTReport("account", "secret", staging_layout="per_account", registry=registry, load_mode="replace")
+    replaced = []
+
+    class ReplacingLoader(FakeLoader):
+
+        def replace_window_in_clickhouse(self, batches, start, end, db_name=None, run_load=None, tags=None) -> int:
+            replaced.append((start.isoformat(), end.isoformat(), db_name))
+            return sum(len(batch) for batch in batches)
+
+    elt.loader = ReplacingLoader()
+    monkeypatch.setattr(elt, "post_report", lambda start_time, end_time: "report")
+    monkeypatch.setattr(elt, "check_report_status", lambda id: True)
+    monkeypatch.setattr(elt, "extract", lambda id: {})
+    monkeypatch.setattr(elt, "enrich", lambda data, start_time, end_time: [{"impressions": 1}, {"impressions": 2}])
+    assert elt.elt("2025-06-01", "2025-06-08", stream=False) == 2
+    assert replaced == [("2025-06-01", "2025-06-08", "st_account")]
+    assert elt.loader.batches == []
+
+
+def test_failed_status_poll_retries_the_unpolled_windows(elt, monkeypatch):
+    posted = []
+    polls = []
+
+    class FailingPoller:
+
+        cleaner = SimpleNamespace(is_ready_to_download=lambda state: state == "completed")
+
+        def __init__(self, api_key: str, api_secret: str) -> None:
+            pass
+
+        def iter_finished(self, ids):
+            polls.append(list(ids))
+            yield polls[-1][0], "completed"
+            if len(polls) == 1:
+                raise HTTPError("503 Server Error")
+            for id in polls[-1][1:]:
+                yield id, "completed"
+
+    def post_report(start_time: str, end_time: str) -> str:
+        posted.append(start_time)
+        return f"report-{len(posted)}"
+
+    monkeypatch.setattr(orch.pl_lift, "ReportStatusPoller", FailingPoller)
+    monkeypatch.setattr(elt, "post_report", post_report)
+    monkeypatch.setattr(elt, "load_report_streaming", lambda id, start_time, end_time, runner: 1)
+    loaded = elt.elt_windows("2025-06-01", "2025-06-15", window_days=7, max_attempts=2)
+    assert loaded == {("2025-06-01", "2025-06-08"): 1, ("2025-06-08", "2025-06-15"): 1}
+    assert posted == ["2025-06-01", "2025-06-08", "2025-06-08"]
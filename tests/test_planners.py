@@ -0,0 +1,37 @@
+import pytest
+
+from src.app.planners import liftoff as pn_lift
+
+
+def test_split_makes_half_open_windows_of_window_days():
+    planner = pn_lift.ReportWindowPlanner(7)
+    assert planner.split("2025-06-01", "2025-06-16") == [
+        ("2025-06-01", "2025-06-08"),
+        ("2025-06-08", "2025-06-15"),
+        ("2025-06-15", "2025-06-16"),
+    ]
+
+
+def test_window_days_must_be_positive():
+    with pytest.raises(ValueError):
+        pn_lift.ReportWindowPlanner(0)
+
+
+def test_group_windows_grows_the_groups_to_fit_max_groups():
+    windows = {"first": [("a", "b"), ("b", "c"), ("c", "d")], "second": [("a", "b")], "third": []}
+    assert pn_lift.group_windows(windows, 4) == [
+        ("first", [("a", "b")]),
+        ("first", [("b", "c")]),
+        ("first", [("c", "d")]),
+        ("second", [("a", "b")]),
+    ]
+    assert pn_lift.group_windows(windows, 3) == [
+        ("first", [("a", "b"), ("b", "c")]),
+        ("first", [("c", "d")]),
+        ("second", [("a", "b")]),
+    ]
+
+
+def test_group_windows_fails_when_the_keys_alone_do_not_fit():
+    with pytest.raises(ValueError):
+        pn_lift.group_windows({"first": [("a", "b")], "second": [("a", "b")]}, 1)
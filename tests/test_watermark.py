@@ -0,0 +1,35 @@
+from datetime import date
+from types import SimpleNamespace
+
+from src.app.extractors import watermark as ex_watermark
+from src.db.clickhouse import models
+
+
+class FakeClient:
+
+    def __init__(self, rows: list[tuple]) -> None:
+        self.rows = rows
+        self.statements: list[str] = []
+
+    def command(self, query: str) -> None:
+        self.statements.append(query)
+
+    def query(self, query: str) -> SimpleNamespace:
+        self.statements.append(query)
+        return SimpleNamespace(result_rows=self.rows)
+
+
+def test_consolidated_watermarks_create_the_database_and_table_first():
+    client = FakeClient([("account", date(2025, 6, 10))])
+    extractor = ex_watermark.LiftoffReportWatermarkExtractor(ch_client=client)
+    assert extractor.get_watermarks(staging_layout="consolidated") == {"account": date(2025, 6, 10)}
+    model = models.LiftoffConsolidatedReportModel
+    assert client.statements[:2] == [model.create_database_query(), model.create_table_query()]
+    assert "SELECT api_key" in client.statements[2]
+
+
+def test_start_time_is_the_day_after_the_watermark_minus_the_lookback():
+    get_start_time = ex_watermark.LiftoffReportWatermarkExtractor.get_start_time
+    assert get_start_time(date(2025, 6, 10), 3) == "2025-06-08"
+    assert get_start_time(date(2025, 6, 10), 0) == "2025-06-11"
+    assert get_start_time(None, 3) == "2025-06-01"